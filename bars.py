@@ -0,0 +1,86 @@
+"""
+Bar intervals and OHLCV resampling.
+
+Only the finest interval of an asset class is downloaded and stored (see
+STORE_INTERVALS); coarser bars are aggregated from it on the fly:
+
+  1h → 1d → 1W → 1M
+
+Each coarser bar is labelled with the date of its last underlying bar, so
+resampled weekly/monthly bars fall on real trading days and align with the
+daily series. Results are kept in the "bars" cache until the source bars
+change (a content hash of the whole frame, so re-adjusted history with the
+same last bar is resampled again).
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+import cache
+
+INTERVALS = ["1h", "1d", "1W", "1M"]
+
+
+def finer(a: str, b: str) -> bool:
+    """True if interval a is strictly finer than b."""
+    return INTERVALS.index(a) < INTERVALS.index(b)
+
+
+def _period_codes(index: pd.DatetimeIndex, interval: str) -> np.ndarray:
+    days = np.asarray(index, dtype="datetime64[D]").astype(np.int64)
+    if interval == "1d":
+        return days
+    if interval == "1W":
+        return days - index.dayofweek.to_numpy()       # Monday of the week
+    if interval == "1M":
+        return index.year.to_numpy() * 12 + index.month.to_numpy()
+    raise ValueError(f"cannot resample to {interval!r}")
+
+
+def resample(df: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """Aggregate sorted OHLCV bars into `interval` bars (first/max/min/last/sum)."""
+    if df.empty:
+        return df
+    codes = _period_codes(df.index, interval)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)] - 1
+
+    out = {}
+    if "Open" in df:
+        out["Open"] = df["Open"].to_numpy()[starts]
+    if "High" in df:
+        out["High"] = np.fmax.reduceat(df["High"].to_numpy(), starts)
+    if "Low" in df:
+        out["Low"] = np.fmin.reduceat(df["Low"].to_numpy(), starts)
+    if "Close" in df:
+        out["Close"] = df["Close"].to_numpy()[ends]
+    if "Volume" in df:
+        out["Volume"] = np.add.reduceat(np.nan_to_num(df["Volume"].to_numpy()), starts)
+    index = pd.DatetimeIndex(df.index[ends].normalize(), name=df.index.name)
+    return pd.DataFrame(out, index=index)
+
+
+def _fingerprint(df: pd.DataFrame, source: str) -> str:
+    """Content hash of an OHLCV frame (dates, columns and values) and its interval."""
+    h = hashlib.sha1(source.encode("utf-8"))
+    h.update(np.asarray(df.index, dtype="datetime64[ns]").view("int64").tobytes())
+    h.update(",".join(map(str, df.columns)).encode("utf-8"))
+    h.update(np.ascontiguousarray(df.to_numpy(dtype="float64")).tobytes())
+    return h.hexdigest()
+
+
+def convert(ticker: str, df: pd.DataFrame, source: str, interval: str) -> pd.DataFrame:
+    """`df` (bars at `source`) as `interval` bars, served from cache while the source is unchanged."""
+    if interval == source:
+        return df
+    if finer(interval, source):
+        raise ValueError(f"{ticker}: cannot derive {interval} bars from {source} bars")
+    fingerprint = _fingerprint(df, source)
+    key = f"{ticker}_{interval}"
+    hit = cache.get("bars", key)
+    if hit is not None and hit[0] == fingerprint:
+        return hit[1]
+    result = resample(df, interval)
+    cache.put("bars", key, (fingerprint, result))
+    return result
@@ -0,0 +1,159 @@
+"""
+Unified on-disk cache with per-namespace TTLs.
+
+Entries live in CACHE_DIR/<namespace>/<key>.pkl and store their write time,
+so a TTL always counts from the last fetch, not from the day the process
+was started. Writes are atomic (temp file + rename). A hit refreshes the
+file's mtime, and once the cache grows past CACHE_MAX_BYTES the least
+recently used entries are evicted. Hit/miss counters are kept per namespace
+and printed by report().
+"""
+import functools
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable
+
+from config import CACHE_DIR, CACHE_TTLS, CACHE_MAX_BYTES
+
+_MISS = object()
+_LEGACY = ("batch_*.pkl", "macro_*.pkl", "fund_*.pkl", "headlines.pkl")
+
+hits: Counter = Counter()
+misses: Counter = Counter()
+_lock = threading.Lock()
+_total_bytes: int | None = None
+
+Path(CACHE_DIR).mkdir(parents=True, exist_ok=True)
+
+
+def _clean_legacy():
+    # Files from the per-module pickle caches this module replaced
+    for pattern in _LEGACY:
+        for f in Path(CACHE_DIR).glob(pattern):
+            f.unlink(missing_ok=True)
+
+
+_clean_legacy()
+
+
+def _path(namespace: str, key: str) -> Path:
+    return Path(CACHE_DIR) / namespace / (re.sub(r"[^A-Za-z0-9.\-]", "_", key) + ".pkl")
+
+
+def _entries() -> list[Path]:
+    return list(Path(CACHE_DIR).glob("*/*.pkl"))
+
+
+def get(namespace: str, key: str, default: Any = None) -> Any:
+    """Return the cached value, or `default` if it is missing or older than the namespace TTL."""
+    path = _path(namespace, key)
+    try:
+        with open(path, "rb") as fh:
+            written, value = pickle.load(fh)
+    except Exception:
+        with _lock:
+            misses[namespace] += 1
+        return default
+    if time.time() - written > CACHE_TTLS[namespace]:
+        _remove(path)
+        with _lock:
+            misses[namespace] += 1
+        return default
+    try:
+        os.utime(path)          # LRU: a hit counts as a use
+    except OSError:
+        pass
+    with _lock:
+        hits[namespace] += 1
+    return value
+
+
+def put(namespace: str, key: str, value: Any):
+    global _total_bytes
+    path = _path(namespace, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    old = path.stat().st_size if path.exists() else 0
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump((time.time(), value), fh)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    with _lock:
+        if _total_bytes is None:
+            _total_bytes = sum(p.stat().st_size for p in _entries())
+        else:
+            _total_bytes += path.stat().st_size - old
+        over = _total_bytes > CACHE_MAX_BYTES
+    if over:
+        _evict()
+
+
+def _remove(path: Path):
+    global _total_bytes
+    try:
+        size = path.stat().st_size
+        path.unlink()
+    except OSError:
+        return
+    with _lock:
+        if _total_bytes is not None:
+            _total_bytes -= size
+
+
+def _evict():
+    """Drop least recently used entries until the cache is back under 90% of its budget."""
+    global _total_bytes
+    files = []
+    for p in _entries():
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, p))
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    target = CACHE_MAX_BYTES * 0.9
+    for _, size, p in files:
+        if total <= target:
+            break
+        p.unlink(missing_ok=True)
+        total -= size
+    with _lock:
+        _total_bytes = total
+
+
+def cached(namespace: str, keep: Callable[[Any], bool] = lambda v: True):
+    """
+    Decorator for per-ticker fetchers: f(ticker) is served from `namespace`
+    while fresh. Results for which keep(result) is false are not stored, and
+    neither is anything when f raises: fetchers let request errors propagate
+    so that run_per_ticker gives the ticker its default for this run only.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(ticker: str, *args, **kwargs):
+            value = get(namespace, ticker, _MISS)
+            if value is not _MISS:
+                return value
+            value = fn(ticker, *args, **kwargs)
+            if keep(value):
+                put(namespace, ticker, value)
+            return value
+        return wrapper
+    return decorator
+
+
+def report():
+    namespaces = sorted(set(hits) | set(misses))
+    if namespaces:
+        print("  Cache: " + ", ".join(
+            f"{ns} {hits[ns]} hit/{misses[ns]} miss" for ns in namespaces))
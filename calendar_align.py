@@ -0,0 +1,67 @@
+"""
+Trading-calendar alignment for macro and relative-strength features.
+
+Tickers on the same exchange share one date index (US, Xetra, 24/7 crypto).
+Aligner builds, once per (source series, calendar) pair, the searchsorted
+position map that `series.reindex(calendar, method="ffill")` would compute,
+so every ticker on that calendar fills its columns with a single NumPy
+gather instead of its own reindex calls (and the hash tables they build).
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+def _key(index: pd.DatetimeIndex) -> str:
+    return hashlib.sha1(np.asarray(index, dtype="datetime64[ns]").view("int64").tobytes()).hexdigest()
+
+
+def ffill_positions(source: pd.DatetimeIndex, target: pd.DatetimeIndex) -> np.ndarray:
+    """Position of the last `source` date on or before each `target` date (-1 if none)."""
+    return np.searchsorted(np.asarray(source, dtype="datetime64[ns]"),
+                           np.asarray(target, dtype="datetime64[ns]"), side="right") - 1
+
+
+def gather(values: np.ndarray, pos: np.ndarray) -> np.ndarray:
+    """values[pos] along the first axis, NaN where pos is -1."""
+    out = values[np.maximum(pos, 0)].astype(float)
+    out[pos < 0] = np.nan
+    return out
+
+
+def pct_change(values: np.ndarray, k: int) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[k:] = values[k:] / values[:-k] - 1
+    return out
+
+
+class Aligner:
+    """Caches position maps and aligned series per calendar for one run."""
+
+    def __init__(self):
+        self._positions: dict[tuple, np.ndarray] = {}
+        self._aligned: dict[tuple, np.ndarray] = {}
+
+    @staticmethod
+    def calendar(index: pd.DatetimeIndex) -> str:
+        """Key shared by every ticker trading on exactly these dates."""
+        return _key(index)
+
+    def positions(self, name: str, source: pd.DatetimeIndex, target: pd.DatetimeIndex) -> np.ndarray:
+        """ffill_positions(source, target), computed once per (name, calendar of target)."""
+        cache_key = (name, self.calendar(target))
+        pos = self._positions.get(cache_key)
+        if pos is None:
+            pos = self._positions[cache_key] = ffill_positions(source, target)
+        return pos
+
+    def align(self, name: str, series: pd.Series, target: pd.DatetimeIndex) -> np.ndarray:
+        """series.reindex(target, method="ffill").to_numpy(), once per (name, calendar)."""
+        cache_key = (name, self.calendar(target))
+        values = self._aligned.get(cache_key)
+        if values is None:
+            pos = self.positions(name, series.index, target)
+            values = self._aligned[cache_key] = gather(series.to_numpy(), pos)
+        return values
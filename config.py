@@ -100,14 +100,82 @@ TICKER_NAMES = {
 HORIZONS = {"1W": 5, "1M": 21, "3M": 63, "6M": 126}
 GAIN_THRESHOLDS = {"1W": 0.02, "1M": 0.05, "3M": 0.10, "6M": 0.15}
 
+# Weekly retrain: "incremental" continues boosting the saved ensembles on recent
+# rows (falling back to a full rebuild per horizon), "full" always rebuilds
+RETRAIN_MODE = os.getenv("RETRAIN_MODE", "incremental")
+WARM_START_DAYS = 730         # calendar days of recent rows the boosters continue on
+WARM_START_ROUNDS = 50        # boosting rounds added per update
+WARM_START_MIN_ROWS = 200     # new labelled rows needed to validate an update
+WARM_START_AUC_DROP = 0.01    # holdout AUC loss that triggers a full rebuild
+WARM_START_MAX_UPDATES = 8    # warm starts before a full rebuild regardless
+
+# Data provider: live | record | replay (see provider.py)
+PROVIDER_MODE = os.getenv("PROVIDER_MODE", "live")
+FIXTURE_DIR = os.getenv("FIXTURE_DIR", "fixtures")
+REPLAY_LATENCY = float(os.getenv("REPLAY_LATENCY", "0"))
+RUN_DIR = os.path.join(FIXTURE_DIR, "run")   # scratch outputs of record/replay runs
+
+
+def _out(path: str) -> str:
+    return path if PROVIDER_MODE == "live" else os.path.join(RUN_DIR, path)
+
+
 DATA_PERIOD = "5y"
-MODEL_DIR = "models"
-CACHE_DIR = "cache"
-DB_PATH = "results.db"
+# Finest bar interval downloaded and stored per asset group; coarser bars
+# (1h → 1d → 1W → 1M) are resampled from it (see bars.py). Yahoo serves 1h
+# bars for the last 730 days only.
+STORE_INTERVALS = {
+    "US Stocks":     "1d",
+    "German Stocks": "1d",
+    "Crypto":        "1d",
+    "ETFs":          "1d",
+}
+MODEL_DIR = _out("models")
+CACHE_DIR = _out("cache")
+CACHE_MAX_BYTES = 256 * 1024 ** 2
+CACHE_TTLS = {               # seconds, per cache namespace
+    "fundamentals": 7 * 86400,
+    "analysts":     86400,
+    "insiders":     86400,
+    "earnings":     86400,
+    "options":      4 * 3600,
+    "feeds":        3600,
+    "sentiment":    30 * 86400,
+    "bars":         7 * 86400,
+    "folds":        7 * 86400,
+    "inactive":     7 * 86400,   # tickers skipped after repeated empty downloads
+}
+STORE_DIR = _out("store")    # persistent per-ticker OHLCV partitions
+FEATURE_STORE_DIR = _out("features")   # feature rows + indicator states per ticker (feature_store)
+# Check streamed feature rows against a full recomputation over the stored history
+INDICATOR_VERIFY = os.getenv("INDICATOR_VERIFY", "") == "1"
+# Record per-feature timings, allocations and data quality (feature_report table)
+FEATURE_PROFILE = os.getenv("FEATURE_PROFILE", "") == "1"
+DB_PATH = _out("results.db")
+PICKS_PATH = _out("picks.json")
 TOP_N = 15
 MIN_DATA_ROWS = 300
 DAILY_RUN_TIME = "07:00"
 
+# Feature computation: processes and tickers per process chunk (feature_pool)
+FEATURE_WORKERS = int(os.getenv("FEATURE_WORKERS", os.cpu_count() or 1))
+FEATURE_CHUNK = 32
+
+# Model training: (horizon, fold) fits spread over TRAIN_WORKERS processes that
+# share TRAIN_THREADS cores between them; 1 worker trains serially in-process
+TRAIN_WORKERS = int(os.getenv("TRAIN_WORKERS", os.cpu_count() or 1))
+TRAIN_THREADS = int(os.getenv("TRAIN_THREADS", os.cpu_count() or 1))
+
+# Enrichment fetches (fundamentals, sentiment, insiders, analysts, options, earnings)
+FETCH_WORKERS = 8
+CALL_DEADLINE = 30           # seconds before a single ticker's call is abandoned
+SENTIMENT_BATCH_SIZE = 8     # symbols per Yahoo RSS request
+RATE_LIMITS = {              # call starts per second, per upstream host
+    "query2.finance.yahoo.com": 4.0,
+    "feeds.finance.yahoo.com": 4.0,
+    "default": 2.0,
+}
+
 SECTOR_MAP = {
     "AAPL": "XLK", "MSFT": "XLK", "NVDA": "XLK", "AVGO": "XLK", "ADBE": "XLK",
     "CRM": "XLK",  "ORCL": "XLK", "CSCO": "XLK", "QCOM": "XLK", "TXN": "XLK",
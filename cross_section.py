@@ -0,0 +1,111 @@
+"""
+Cross-sectional panel features.
+
+For every date, each ticker's momentum, volatility and volume ratio are
+ranked and z-scored against the rest of the universe and against its own
+asset class. The per-ticker feature frames are stacked into one (date ×
+ticker) matrix per source column over the union of their calendars; a
+ticker's last row is carried forward for up to _FFILL_LIMIT dates so that
+weekend crypto bars and exchange holidays still see the whole universe.
+Ranking is one argsort along the ticker axis per scope, so the cost is
+O(dates × tickers × log tickers) with no per-date Python loop.
+
+Ranks are ordinal percentiles in [0, 1] (0.5 for a lone ticker); z-scores
+use the population std, are clipped to ±_Z_CLIP and are 0 for a constant
+cross-section. Both are NaN exactly where the source feature is missing.
+"""
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+# Source feature → short name used in the xs_* columns
+SOURCES = {"momentum_12m_1m": "mom", "atr_pct": "vol", "volume_ratio": "volume"}
+
+XS_COLS = [f"xs_{short}_{stat}{scope}"
+           for short in SOURCES.values()
+           for scope in ("", "_class")
+           for stat in ("rank", "z")]
+
+_FFILL_LIMIT = 5
+_Z_CLIP = 5.0
+
+
+def _stack(features: Mapping[str, pd.DataFrame], tickers: list[str]) -> tuple[np.ndarray, list[np.ndarray]]:
+    """Union calendar and, per ticker, the positions of its rows on it."""
+    stamps = [np.asarray(features[t].index, dtype="datetime64[ns]") for t in tickers]
+    dates = np.unique(np.concatenate(stamps)) if stamps else np.empty(0, dtype="datetime64[ns]")
+    return dates, [np.searchsorted(dates, s) for s in stamps]
+
+
+def _ffill(m: np.ndarray, present: np.ndarray, limit: int) -> np.ndarray:
+    """Carry each column's last present row forward for at most `limit` rows."""
+    rows = np.arange(len(m))[:, None]
+    last = np.maximum.accumulate(np.where(present, rows, -1), axis=0)
+    filled = m[np.maximum(last, 0), np.arange(m.shape[1])]
+    filled[(last < 0) | (rows - last > limit)] = np.nan
+    return filled
+
+
+def rank(m: np.ndarray) -> np.ndarray:
+    """Ordinal percentile rank of each row's non-NaN values, in [0, 1]."""
+    valid = ~np.isnan(m)
+    n = valid.sum(axis=1, keepdims=True)
+    order = np.argsort(m, axis=1, kind="stable")         # NaN sorts last
+    ranks = np.empty(m.shape)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(m.shape[1], dtype=float), m.shape), axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(n > 1, ranks / (n - 1), 0.5)
+    out[~valid] = np.nan
+    return out
+
+
+def zscore(m: np.ndarray) -> np.ndarray:
+    """(x - row mean) / row std over each row's non-NaN values, clipped to ±_Z_CLIP."""
+    valid = ~np.isnan(m)
+    n = valid.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(valid, m, 0.0).sum(axis=1, keepdims=True) / n
+        dev = np.where(valid, m - mean, 0.0)
+        std = np.sqrt((dev ** 2).sum(axis=1, keepdims=True) / n)
+        out = np.where(std > 0, dev / std, 0.0)
+    out = np.clip(out, -_Z_CLIP, _Z_CLIP)
+    out[~valid] = np.nan
+    return out
+
+
+def add_features(features: dict[str, pd.DataFrame], classes: Mapping[str, str]):
+    """
+    Fill the XS_COLS of every frame in `features` (in place). `classes` maps
+    each ticker to its asset class; tickers missing from it form one class.
+    """
+    tickers = [t for t, feat in features.items() if len(feat)]
+    if not tickers:
+        return
+    dates, positions = _stack(features, tickers)
+    present = np.zeros((len(dates), len(tickers)), dtype=bool)
+    for j, pos in enumerate(positions):
+        present[pos, j] = True
+    labels = np.array([classes.get(t, "") for t in tickers])
+    groups = [labels == c for c in np.unique(labels)]
+
+    out = [np.empty((len(pos), len(XS_COLS))) for pos in positions]
+    k = 0
+    for source in SOURCES:
+        m = np.full((len(dates), len(tickers)), np.nan)
+        for j, (t, pos) in enumerate(zip(tickers, positions)):
+            m[pos, j] = features[t][source].to_numpy(dtype=float)
+        m[~np.isfinite(m)] = np.nan
+        m = _ffill(m, present, _FFILL_LIMIT)
+
+        stats = [rank(m), zscore(m), np.empty(m.shape), np.empty(m.shape)]
+        for g in groups:
+            stats[2][:, g] = rank(m[:, g])
+            stats[3][:, g] = zscore(m[:, g])
+        for j, pos in enumerate(positions):
+            for i, stat in enumerate(stats):
+                out[j][:, k + i] = stat[pos, j]
+        k += len(stats)
+
+    for t, values in zip(tickers, out):
+        features[t][XS_COLS] = values
@@ -1,13 +1,14 @@
-import pickle
-from datetime import date
-from pathlib import Path
+import time
 
 import pandas as pd
 import yfinance as yf
 
-from config import US_STOCKS, DE_STOCKS, CRYPTO, ETFS, DATA_PERIOD, CACHE_DIR, MIN_DATA_ROWS
-
-Path(CACHE_DIR).mkdir(exist_ok=True)
+import bars
+import cache
+import price_store
+import provider
+from price_panel import PricePanel
+from config import US_STOCKS, DE_STOCKS, CRYPTO, ETFS, DATA_PERIOD, MIN_DATA_ROWS, STORE_INTERVALS
 
 _GROUPS = [
     ("US Stocks",      US_STOCKS),
@@ -16,60 +17,287 @@ _GROUPS = [
     ("ETFs",           ETFS),
 ]
 
+_FIELDS = price_store.FIELDS
 
-def _cache_path(group_name: str) -> Path:
-    return Path(CACHE_DIR) / f"batch_{group_name.replace(' ', '_')}_{date.today()}.pkl"
+# Bars before the last stored one that are downloaded again and compared with
+# the store. A mismatch means Yahoo re-adjusted the history (split/dividend),
+# so that ticker is re-downloaded in full instead of appended to.
+_OVERLAP_BARS = 5
+_ADJ_TOLERANCE = 1e-3
 
+# Longest history Yahoo serves per interval (intraday bars are capped)
+_MAX_PERIOD = {"1h": "730d"}
 
-def _clean_old_cache():
-    today = str(date.today())
-    for f in Path(CACHE_DIR).glob("batch_*.pkl"):
-        if today not in f.name:
-            f.unlink(missing_ok=True)
+_RETRIES = 3
+_BACKOFF_BASE = 5.0      # seconds, doubled per retry
 
+# A full download this many bars shorter than the stored history in the
+# same window is a truncated response, not a short-lived ticker
+_TRUNCATION_SLACK = 5
 
-def _download_group(name: str, tickers: list[str]) -> dict[str, pd.DataFrame]:
-    cache = _cache_path(name)
-    if cache.exists():
-        print(f"  {name}: loaded from cache.")
-        return pickle.load(open(cache, "rb"))
+# A ticker that comes back empty on this many consecutive runs (while most
+# of its group downloads fine) is delisted or renamed: it is served from the
+# store without requests until its "inactive" cache entry expires
+_INACTIVE_AFTER = 3
 
-    print(f"  {name}: downloading {len(tickers)} tickers...", end="\r")
-    try:
-        raw = yf.download(
-            tickers, period=DATA_PERIOD, interval="1d",
-            auto_adjust=True, progress=False,
-        )
-    except Exception as e:
-        print(f"  {name}: batch download failed ({e}), skipping.")
-        return {}
+# ticker -> date of the last good bar, for tickers served from the store
+# because every download attempt failed in this run
+STALE: dict[str, pd.Timestamp] = {}
 
-    result = {}
-    fields = ["Open", "High", "Low", "Close", "Volume"]
 
+def _period(interval: str) -> str:
+    return _MAX_PERIOD.get(interval, DATA_PERIOD)
+
+
+def period_start(period: str = DATA_PERIOD, end: pd.Timestamp | None = None) -> pd.Timestamp:
+    """First date of a yfinance-style period window ("5y", "18mo", "90d") ending at `end` (default today)."""
+    end = pd.Timestamp.today().normalize() if end is None else pd.Timestamp(end)
+    n = int("".join(c for c in period if c.isdigit()))
+    if period.endswith("y"):
+        return end - pd.DateOffset(years=n)
+    if period.endswith("mo"):
+        return end - pd.DateOffset(months=n)
+    return end - pd.DateOffset(days=n)
+
+
+def _download(tickers: list[str], interval: str = "1d", **kwargs) -> pd.DataFrame:
+    return provider.call(
+        "download", (tuple(tickers), interval, sorted(kwargs.items())),
+        lambda: yf.download(tickers, interval=interval, auto_adjust=True, progress=False, **kwargs),
+    )
+
+
+def _extract(raw: pd.DataFrame, tickers: list[str], ticker: str) -> pd.DataFrame:
+    if len(tickers) == 1:
+        df = raw[[f for f in _FIELDS if f in raw]]
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = df.columns.get_level_values(0)
+    else:
+        df = pd.DataFrame({f: raw[f][ticker] for f in _FIELDS if f in raw})
+    df = df.dropna(how="all")
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    return df
+
+
+def _readjusted(stored: pd.DataFrame, fresh: pd.DataFrame) -> bool:
+    """True if overlapping closes (excluding the possibly partial last bar) moved."""
+    overlap = stored.index[:-1].intersection(fresh.index)
+    if overlap.empty:
+        return False
+    old = stored.loc[overlap, "Close"]
+    new = fresh.loc[overlap, "Close"]
+    drift = ((new - old).abs() / old.abs()).max()
+    return bool(drift > _ADJ_TOLERANCE)
+
+
+def _full_download(tickers: list[str], stored: dict[str, pd.DataFrame],
+                   interval: str = "1d") -> dict[str, pd.DataFrame]:
+    """
+    Download the whole DATA_PERIOD window and overwrite the store with
+    whatever came back, however short the ticker's history. Tickers that
+    come back empty, or truncated compared with their `stored` history in the
+    same window, are left out (and the store keeps that history).
+    """
+    if not tickers:
+        return {}
+    raw = _download(tickers, interval, period=_period(interval))
+    cutoff = period_start(_period(interval))
+    result = {}
     for ticker in tickers:
         try:
-            if len(tickers) == 1:
-                df = raw[fields].dropna(how="all")
-            else:
-                df = pd.DataFrame(
-                    {f: raw[f][ticker] for f in fields if f in raw}
-                ).dropna(how="all")
-
-            if len(df) >= MIN_DATA_ROWS:
-                result[ticker] = df
+            df = _extract(raw, tickers, ticker)
         except Exception:
             continue
+        if df.empty:
+            continue
+        old = stored.get(ticker)
+        if old is not None and len(df) < (old.index >= cutoff).sum() - _TRUNCATION_SLACK:
+            continue
+        price_store.replace(ticker, df, interval)
+        result[ticker] = df
+    return result
+
 
-    print(f"  {name}: {len(result)}/{len(tickers)} assets ready.     ")
-    pickle.dump(result, open(cache, "wb"))
+def _incremental_download(stored: dict[str, pd.DataFrame], interval: str = "1d") -> tuple[dict, list[str], int]:
+    """
+    Fetch only the bars after each ticker's last stored date (plus a small
+    overlap) and append them to the store: one batched request per distinct
+    start date, so a ticker that stopped updating does not pull the whole
+    group's request back to its own last bar.
+    Returns (updated frames, tickers needing a full re-download, new bar count).
+    Tickers that came back empty are left out of the updated frames.
+    """
+    by_start: dict[str, list[str]] = {}
+    for ticker, df in stored.items():
+        start = df.index[-min(_OVERLAP_BARS, len(df))]
+        by_start.setdefault(start.strftime("%Y-%m-%d"), []).append(ticker)
+
+    result, redo, new_bars = {}, [], 0
+    for start, tickers in sorted(by_start.items()):
+        raw = _download(tickers, interval, start=start)
+        for ticker in tickers:
+            old = stored[ticker]
+            try:
+                fresh = _extract(raw, tickers, ticker)
+            except Exception:
+                continue
+            if fresh.empty:
+                continue
+            if _readjusted(old, fresh):
+                redo.append(ticker)
+                continue
+            # Re-append the last stored bar too: it may have been a partial bar
+            # (crypto trades through the 05:00 UTC run).
+            tail = fresh[fresh.index >= old.index[-1]]
+            price_store.append(ticker, tail, interval)
+            new_bars += int((tail.index > old.index[-1]).sum())
+            merged = pd.concat([old, tail])
+            result[ticker] = merged[~merged.index.duplicated(keep="last")]
+    return result, redo, new_bars
+
+
+def _fetch_once(name: str, tickers: list[str], stored: dict,
+                interval: str = "1d") -> tuple[dict, int, int]:
+    """One incremental + one full batch for `tickers`. Returns (frames, new bars, full downloads)."""
+    frames, redo, new_bars = {}, [], 0
+    try:
+        frames, redo, new_bars = _incremental_download({t: stored[t] for t in tickers if t in stored}, interval)
+    except Exception as e:
+        print(f"  {name}: incremental download failed ({e}).")
+    full = [t for t in tickers if t not in stored] + redo
+    try:
+        frames.update(_full_download(full, stored, interval))
+    except Exception as e:
+        print(f"  {name}: full download failed ({e}).")
+    return frames, new_bars, len(full)
+
+
+def download_group(name: str, tickers: list[str], min_rows: int = MIN_DATA_ROWS,
+                   interval: str = "1d") -> dict[str, pd.DataFrame]:
+    """
+    Bring `tickers` up to date in the store with batched requests and return
+    the `interval` frames of those with at least `min_rows` bars in the
+    window. Only tickers that came back empty or truncated are retried, with
+    exponential back-off; a short but complete history is stored as is. Those
+    still failing fall back to their stored history and are recorded in STALE.
+    A ticker that already failed on the previous run is tried once, and after
+    _INACTIVE_AFTER failed runs not at all until its inactive mark expires.
+    """
+    stored = {}
+    for ticker in tickers:
+        df = price_store.load(ticker, interval)
+        if df is not None and not df.empty:
+            stored[ticker] = df
+
+    key = {t: t if interval == "1d" else f"{t}@{interval}" for t in tickers}
+    streak = {t: cache.get("inactive", key[t], 0) for t in tickers}
+    inactive = [t for t in tickers if streak[t] >= _INACTIVE_AFTER]
+
+    print(f"  {name}: updating {len(stored)} stored, downloading {len(tickers) - len(stored)} new...", end="\r")
+    frames, new_bars, full = {}, 0, 0
+    todo = [t for t in tickers if t not in inactive]
+    for attempt in range(_RETRIES + 1):
+        if attempt:
+            pause = _BACKOFF_BASE * 2 ** (attempt - 1)
+            print(f"  {name}: retrying {len(todo)} failed ticker(s) in {pause:.0f}s...")
+            time.sleep(pause)
+        got, n_bars, n_full = _fetch_once(name, todo, stored, interval)
+        frames.update(got)
+        new_bars += n_bars
+        full += n_full
+        todo = [t for t in todo if t not in got and not streak[t]]
+        if not todo:
+            break
+
+    failed = [t for t in tickers if t not in frames and t not in inactive]
+    # Most of the group failing is an outage, not delisted tickers
+    if len(failed) <= (len(tickers) - len(inactive)) / 2:
+        for ticker in failed:
+            cache.put("inactive", key[ticker], streak[ticker] + 1)
+    for ticker in frames:
+        if streak[ticker]:
+            cache.put("inactive", key[ticker], 0)
+
+    for ticker in failed + inactive:
+        if ticker in stored:
+            frames[ticker] = stored[ticker]
+            STALE[ticker] = stored[ticker].index[-1]
+    if failed:
+        print(f"  {name}: {len(failed)} ticker(s) failed; "
+              f"stale: {', '.join(t for t in failed if t in STALE) or 'none'}, "
+              f"dropped: {', '.join(t for t in failed if t not in STALE) or 'none'}.")
+    if inactive:
+        print(f"  {name}: {len(inactive)} inactive ticker(s) served from the store: {', '.join(inactive)}.")
+
+    cutoff = period_start(_period(interval))
+    result = {}
+    for ticker in tickers:
+        df = frames.get(ticker)
+        if df is None:
+            continue
+        df = df[df.index >= cutoff]
+        if len(df) >= min_rows:
+            result[ticker] = df
+
+    print(f"  {name}: {len(result)}/{len(tickers)} assets ready "
+          f"({new_bars} new bars, {full} full downloads).     ")
     return result
 
 
-def fetch_all() -> dict[str, pd.DataFrame]:
-    _clean_old_cache()
+def _source_interval(ticker: str, interval: str) -> str:
+    """Stored interval to derive `interval` bars from: the group's finest unless that is coarser."""
+    for name, tickers in _GROUPS:
+        if ticker in tickers:
+            finest = STORE_INTERVALS.get(name, "1d")
+            return interval if bars.finer(interval, finest) else finest
+    return interval
+
+
+def fetch_all(interval: str = "1d") -> PricePanel | dict:
+    """
+    Update the store and return every usable ticker as one float32 PricePanel
+    of `interval` bars, resampled from each group's STORE_INTERVALS bars.
+    """
+    STALE.clear()
     combined = {}
     for name, tickers in _GROUPS:
-        combined.update(_download_group(name, tickers))
+        source = STORE_INTERVALS.get(name, "1d")
+        if bars.finer(interval, source):
+            raise ValueError(f"{name} stores {source} bars; {interval} bars are not available")
+        frames = download_group(name, tickers, interval=source)
+        combined.update({t: bars.convert(t, df, source, interval) for t, df in frames.items()})
     print(f"  Total: {len(combined)} assets loaded.")
-    return combined
+    if not combined:
+        return {}
+    return PricePanel.from_frames(combined)
+
+
+def stored_generation(ticker: str, interval: str = "1d") -> int:
+    """price_store generation of the history `interval` bars of the ticker are derived from."""
+    return price_store.generation(ticker, _source_interval(ticker, interval))
+
+
+def stored_history(ticker: str, interval: str = "1d") -> pd.DataFrame | None:
+    """The ticker's whole stored history as `interval` bars, without downloading."""
+    source = _source_interval(ticker, interval)
+    df = price_store.load(ticker, source)
+    if df is None or df.empty:
+        return None
+    return bars.convert(ticker, df, source, interval)
+
+
+def load_bars(tickers: list[str], interval: str = "1d", min_rows: int = 1) -> dict[str, pd.DataFrame]:
+    """
+    `interval` bars for any tickers through the store: each is fetched at its
+    group's finest stored interval (or at `interval` itself if that is finer)
+    and resampled up.
+    """
+    by_source: dict[str, list[str]] = {}
+    for ticker in tickers:
+        by_source.setdefault(_source_interval(ticker, interval), []).append(ticker)
+    result = {}
+    for source, group in by_source.items():
+        frames = download_group(f"{source} bars", group, min_rows=min_rows, interval=source)
+        result.update({t: bars.convert(t, df, source, interval) for t, df in frames.items()})
+    return result
@@ -0,0 +1,186 @@
+"""
+Shared bounded executor for the per-ticker enrichment stages.
+
+Calls from every stage run on one process-wide pool of FETCH_WORKERS
+threads. Each upstream host has a token bucket that limits how fast calls
+start, and the bucket slows down when the host starts throttling. Each
+call also gets a deadline: once it runs out, the ticker gets its default
+result and the run moves on. The worker thread itself cannot be killed;
+yfinance's own HTTP timeout ends it later and frees it for the next call.
+"""
+import copy
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable
+
+from config import FETCH_WORKERS, CALL_DEADLINE, RATE_LIMITS
+
+YAHOO_API = "query2.finance.yahoo.com"
+YAHOO_RSS = "feeds.finance.yahoo.com"
+
+_MAX_RETRIES = 3
+_BACKOFF_BASE = 2.0      # seconds, doubled per retry
+_MIN_RATE = 0.2          # requests/second floor while throttled
+
+# label -> {ticker: seconds} of the most recent run_per_ticker call
+TIMINGS: dict[str, dict[str, float]] = {}
+
+
+class Throttled(Exception):
+    """Raised inside a per-ticker call when the upstream host rate-limits us."""
+
+
+def _is_throttled(exc: BaseException) -> bool:
+    if isinstance(exc, Throttled) or type(exc).__name__ == "YFRateLimitError":
+        return True
+    text = str(exc)
+    return "429" in text or "Too Many Requests" in text or "Rate limited" in text
+
+
+def raise_if_throttled(exc: BaseException):
+    """Let rate-limit errors escape a module's catch-all so the executor can back off."""
+    if _is_throttled(exc):
+        raise exc
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: float | None = None):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, cost: float = 1.0):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                wait_for = max(self.blocked_until - now, (cost - self.tokens) / self.rate)
+            time.sleep(min(wait_for, 1.0))
+
+    def penalize(self, pause: float):
+        """Halve the rate and pause the whole host for `pause` seconds."""
+        with self.lock:
+            self.rate = max(_MIN_RATE, self.rate / 2)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+    def reward(self):
+        """Step the rate back up (5% of the configured rate) after a success."""
+        with self.lock:
+            self.rate = min(self.base_rate, self.rate + 0.05 * self.base_rate)
+
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _shared_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+        return _pool
+
+
+_buckets: dict[str, _TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket(host: str) -> _TokenBucket:
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = _TokenBucket(RATE_LIMITS.get(host, RATE_LIMITS["default"]))
+        return _buckets[host]
+
+
+def _call(fn: Callable, ticker: str, host: str, cost: float, default: Any, started: dict):
+    limiter = bucket(host)
+    for attempt in range(_MAX_RETRIES + 1):
+        limiter.acquire(cost)
+        started[ticker] = time.monotonic()
+        try:
+            result = fn(ticker)
+            limiter.reward()
+            return result
+        except Exception as e:
+            if not _is_throttled(e) or attempt == _MAX_RETRIES:
+                return copy.copy(default)
+            # Time spent backing off does not count against the deadline
+            started.pop(ticker, None)
+            limiter.penalize(_BACKOFF_BASE * 2 ** attempt)
+    return copy.copy(default)
+
+
+def run_per_ticker(
+    fn: Callable[[str], Any],
+    tickers: list[str],
+    label: str,
+    host: str = YAHOO_API,
+    default: Any = None,
+    cost: float = 1.0,
+    deadline: float = CALL_DEADLINE,
+) -> dict[str, Any]:
+    """
+    Run fn(ticker) for every ticker on the shared pool and return {ticker: result}.
+    Tickers that raise, or run past `deadline` seconds, get a copy of `default`.
+    `cost` is the number of requests one call makes against the host's bucket.
+    """
+    result: dict[str, Any] = {}
+    if not tickers:
+        return result
+
+    started: dict[str, float] = {}
+    timings: dict[str, float] = {}
+    timed_out: list[str] = []
+    t0 = time.monotonic()
+
+    pool = _shared_pool()
+    pending = {}
+    try:
+        pending = {
+            pool.submit(_call, fn, t, host, cost, default, started): t for t in tickers
+        }
+        while pending:
+            done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for fut in done:
+                ticker = pending.pop(fut)
+                result[ticker] = fut.result()
+                timings[ticker] = now - started.get(ticker, now)
+            for fut, ticker in list(pending.items()):
+                begun = started.get(ticker)
+                if begun is not None and now - begun > deadline:
+                    del pending[fut]
+                    result[ticker] = copy.copy(default)
+                    timings[ticker] = now - begun
+                    timed_out.append(ticker)
+            print(f"  {label} {len(result)}/{len(tickers)}", end="\r")
+    finally:
+        # Queued calls of an interrupted run must not hold the shared pool
+        for fut in pending:
+            fut.cancel()
+
+    TIMINGS[label] = timings
+    _report(label, timings, timed_out, time.monotonic() - t0)
+    return {t: result[t] for t in tickers}
+
+
+def _report(label: str, timings: dict[str, float], timed_out: list[str], total: float):
+    if not timings:
+        return
+    slowest = max(timings, key=timings.get)
+    line = (f"  {label}: {len(timings)} tickers in {total:.1f}s "
+            f"(median {statistics.median(timings.values()):.2f}s, "
+            f"slowest {slowest} {timings[slowest]:.2f}s")
+    if timed_out:
+        line += f", {len(timed_out)} timed out: {', '.join(timed_out[:5])}"
+    print(line + ")   ")
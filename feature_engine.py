@@ -1,9 +1,34 @@
+"""
+Feature engine: FEATURE_COLS as a dependency graph of named nodes.
+
+Every feature and every shared intermediate (price diff, gains/losses, EMAs,
+true range, directional movement, ...) is a node declared with @_node and
+the names of the nodes it is computed from. Evaluating a set of columns
+computes each intermediate it needs once and nothing else, so a subset of
+features (or a new one) only pays for its own dependencies.
+
+Nodes work on (bar × ticker) matrices: each ticker's bars form one column,
+left-aligned so bar 0 is every ticker's first bar. Every indicator is
+positional over a ticker's own bars, so one evaluation covers a whole
+PricePanel; shorter histories are padded with NaN at the end, where no
+causal kernel can see them. Values reproduce the ta indicators the models
+were trained on (ta's warm-up zeros for ATR/ADX included). Rolling and EWM
+windows use pandas' 2-D kernels; the Wilder recursions loop over bars with
+whole-row NumPy ops.
+"""
+import time
+import tracemalloc
+from collections import defaultdict
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Callable
+
 import pandas as pd
 import numpy as np
-from ta.momentum import RSIIndicator, StochasticOscillator, ROCIndicator
-from ta.trend import MACD, EMAIndicator, ADXIndicator
-from ta.volatility import BollingerBands, AverageTrueRange
-from ta.volume import OnBalanceVolumeIndicator
+
+# Bump when a feature's definition changes without its name changing
+# (3: rows are computed over the whole stored history, see feature_store)
+FEATURE_VERSION = 3
 
 FEATURE_COLS = [
     # Price momentum
@@ -29,82 +54,429 @@ FEATURE_COLS = [
     "vix_level", "vix_chg_10d", "yield_10y", "yield_chg_20d", "dollar_chg_20d",
     # Relative strength vs sector (filled in main.py)
     "rs_20d", "rs_60d",
+    # Cross-sectional rank / z-score per date, universe and asset class (cross_section, filled in main.py)
+    "xs_mom_rank", "xs_mom_z", "xs_mom_rank_class", "xs_mom_z_class",
+    "xs_vol_rank", "xs_vol_z", "xs_vol_rank_class", "xs_vol_z_class",
+    "xs_volume_rank", "xs_volume_z", "xs_volume_rank_class", "xs_volume_z_class",
 ]
 
 
-def compute_features(df: pd.DataFrame) -> pd.DataFrame:
-    close = df["Close"].squeeze()
-    high = df["High"].squeeze()
-    low = df["Low"].squeeze()
-    volume = df["Volume"].squeeze()
-
-    f = pd.DataFrame(index=df.index)
-
-    # Price momentum (returns)
-    f["ret_1d"] = close.pct_change(1)
-    f["ret_5d"] = close.pct_change(5)
-    f["ret_20d"] = close.pct_change(20)
-    f["ret_60d"] = close.pct_change(60)
-
-    # RSI at three lookbacks
-    f["rsi_9"] = RSIIndicator(close, window=9).rsi()
-    f["rsi_14"] = RSIIndicator(close, window=14).rsi()
-    f["rsi_21"] = RSIIndicator(close, window=21).rsi()
-
-    # MACD
-    macd = MACD(close)
-    f["macd_diff"] = macd.macd_diff()
-    f["macd_signal"] = macd.macd_signal()
-    f["macd_line"] = macd.macd()
-
-    # Bollinger Bands — position and width, not raw levels
-    bb = BollingerBands(close)
-    f["bb_pct"] = bb.bollinger_pband()
-    f["bb_width"] = bb.bollinger_wband()
-
-    # EMA trend (ratios, not raw values, so features are scale-invariant)
-    ema20 = EMAIndicator(close, window=20).ema_indicator()
-    ema50 = EMAIndicator(close, window=50).ema_indicator()
-    ema200 = EMAIndicator(close, window=200).ema_indicator()
-    f["price_vs_ema20"] = (close - ema20) / ema20
-    f["price_vs_ema50"] = (close - ema50) / ema50
-    f["price_vs_ema200"] = (close - ema200) / ema200
-    f["ema20_vs_ema50"] = (ema20 - ema50) / ema50
-    f["ema50_vs_ema200"] = (ema50 - ema200) / ema200
-
-    # Volatility
-    f["atr_pct"] = AverageTrueRange(high, low, close, window=14).average_true_range() / close
-
-    # Stochastic
-    f["stoch"] = StochasticOscillator(close, high, low).stoch()
-
-    # Trend strength
-    f["adx"] = ADXIndicator(high, low, close).adx()
-
-    # Volume
-    vol_avg = volume.rolling(20).mean()
-    f["volume_ratio"] = volume / vol_avg.replace(0, np.nan)
-    f["obv_slope"] = OnBalanceVolumeIndicator(close, volume).on_balance_volume().pct_change(10)
-
-    # Rate of change
-    f["roc_10"] = ROCIndicator(close, window=10).roc()
-    f["roc_20"] = ROCIndicator(close, window=20).roc()
-
-    # Position within 52-week range (scale-invariant)
-    f["high_52w_ratio"] = close / close.rolling(252).max()
-    f["low_52w_ratio"] = close / close.rolling(252).min()
+# Filled in per ticker from its dates (seasonality) or later in main.py (macro, RS, cross-section)
+_DATE_COLS = ["month", "day_of_week"]
+_EXTERNAL_COLS = ["vix_level", "vix_chg_10d", "yield_10y", "yield_chg_20d",
+                  "dollar_chg_20d", "rs_20d", "rs_60d",
+                  *[c for c in FEATURE_COLS if c.startswith("xs_")]]
+_INPUTS = ["close", "high", "low", "volume"]
+
+_ATR_WINDOW = 14
+_ADX_WINDOW = 14
+# ADX needs at least 2 × window + 1 bars (ta raises on fewer)
+_MIN_PANEL_BARS = 2 * _ADX_WINDOW + 1
+
+_NODES: dict[str, tuple[tuple[str, ...], Callable]] = {}
+
+# Opt-in instrumentation (enable_profiling): per node [seconds, allocated
+# bytes, evaluations, tickers] and per (ticker, feature) quality records
+_timings: dict[str, list] | None = None
+_quality: list[dict] = []
+
+
+def _node(name: str, *deps: str):
+    """Register fn(*deps) as the node computing `name`."""
+    def register(fn):
+        _NODES[name] = (deps, fn)
+        return fn
+    return register
+
+
+# ── kernels ─────────────────────────────────────────────────────────────────
+def _shift(a: np.ndarray, k: int) -> np.ndarray:
+    out = np.full_like(a, np.nan)
+    out[k:] = a[:-k]
+    return out
+
+
+def _pct_change(a: np.ndarray, k: int) -> np.ndarray:
+    return a / _shift(a, k) - 1
+
+
+def _rolling(a: np.ndarray, window: int, how: str, **kwargs) -> np.ndarray:
+    return getattr(pd.DataFrame(a).rolling(window), how)(**kwargs).to_numpy()
+
+
+def _ewm(a: np.ndarray, min_periods: int, **kwargs) -> np.ndarray:
+    return pd.DataFrame(a).ewm(min_periods=min_periods, adjust=False, **kwargs).mean().to_numpy()
+
+
+def _wilder_sums(raw: np.ndarray, n: int) -> np.ndarray:
+    """ADXIndicator's running sums: seeded with bars 1..n, each placed one bar early."""
+    smooth = np.zeros((raw.shape[0], raw.shape[1] - n + 1, raw.shape[2]))
+    smooth[:, 0] = raw[:, 1:n + 1].sum(axis=1)
+    for i in range(1, smooth.shape[1] - 1):
+        smooth[:, i] = smooth[:, i - 1] - smooth[:, i - 1] / n + raw[:, n + i]
+    return smooth
+
+
+# ── intermediates ───────────────────────────────────────────────────────────
+@_node("prev_close", "close")
+def _prev_close(close):
+    return _shift(close, 1)
+
+
+@_node("diff", "close", "prev_close")
+def _diff(close, prev_close):
+    return close - prev_close
+
+
+# ta maps the undefined first diff to 0 for both legs
+@_node("gain", "diff")
+def _gain(diff):
+    return np.where(diff > 0, diff, 0.0)
+
+
+@_node("loss", "diff")
+def _loss(diff):
+    return np.where(diff < 0, -diff, 0.0)
+
+
+def _ema_node(span: int):
+    _node(f"ema{span}", "close")(lambda close: _ewm(close, span, span=span))
+
+
+for _span in (12, 20, 26, 50, 200):
+    _ema_node(_span)
+
+
+def _rsi_node(window: int):
+    @_node(f"rsi_{window}", "gain", "loss")
+    def rsi(gain, loss):
+        up = _ewm(gain, window, alpha=1 / window)
+        down = _ewm(loss, window, alpha=1 / window)
+        return np.where(down == 0, 100, 100 - 100 / (1 + up / down))
+
+
+for _window in (9, 14, 21):
+    _rsi_node(_window)
+
+
+def _return_node(k: int, name: str):
+    _node(name, "close")(lambda close: _pct_change(close, k))
+
+
+for _k, _name in ((1, "ret_1d"), (5, "ret_5d"), (10, "ret_10d"), (20, "ret_20d"),
+                  (21, "ret_21d"), (60, "ret_60d"), (252, "ret_252d")):
+    _return_node(_k, _name)
+
+
+@_node("bb_mavg", "close")
+def _bb_mavg(close):
+    return _rolling(close, 20, "mean")
+
+
+@_node("bb_std", "close")
+def _bb_std(close):
+    return _rolling(close, 20, "std", ddof=0)
+
+
+@_node("true_range", "high", "low", "prev_close")
+def _true_range(high, low, prev_close):
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+@_node("atr", "true_range")
+def _atr(tr):
+    """ta's AverageTrueRange: zeros for the first n-1 bars, then Wilder smoothing."""
+    n = _ATR_WINDOW
+    atr = np.zeros_like(tr)
+    atr[n - 1] = np.nanmean(tr[:n], axis=0)
+    for i in range(n, len(tr)):
+        atr[i] = (atr[i - 1] * (n - 1) + tr[i]) / n
+    return atr
+
+
+@_node("directional_movement", "high", "low", "prev_close")
+def _directional_movement(high, low, prev_close):
+    """(range incl. previous close, +DM, -DM) stacked on a leading axis."""
+    up = high - _shift(high, 1)
+    down = _shift(low, 1) - low
+    return np.stack([
+        np.maximum(high, prev_close) - np.minimum(low, prev_close),
+        np.where((up > down) & (up > 0), up, 0.0),
+        np.where((down > up) & (down > 0), down, 0.0),
+    ])
+
+
+@_node("obv", "close", "prev_close", "volume")
+def _obv(close, prev_close, volume):
+    return pd.DataFrame(np.where(close < prev_close, -volume, volume)).cumsum().to_numpy()
+
+
+# ── features ────────────────────────────────────────────────────────────────
+@_node("macd_line", "ema12", "ema26")
+def _macd_line(ema12, ema26):
+    return ema12 - ema26
+
+
+@_node("macd_signal", "macd_line")
+def _macd_signal(macd):
+    return _ewm(macd, 9, span=9)
+
+
+@_node("macd_diff", "macd_line", "macd_signal")
+def _macd_diff(macd, signal):
+    return macd - signal
+
+
+# Bollinger Bands — position and width, not raw levels
+@_node("bb_pct", "close", "bb_mavg", "bb_std")
+def _bb_pct(close, mavg, mstd):
+    hband, lband = mavg + 2 * mstd, mavg - 2 * mstd
+    return (close - lband) / np.where(hband != lband, hband - lband, np.nan)
+
+
+@_node("bb_width", "bb_mavg", "bb_std")
+def _bb_width(mavg, mstd):
+    return 4 * mstd / mavg * 100
+
+
+# EMA trend (ratios, not raw values, so features are scale-invariant)
+def _ratio_node(name: str, a: str, b: str):
+    _node(name, a, b)(lambda x, y: (x - y) / y)
+
+
+for _a, _b in (("close", "ema20"), ("close", "ema50"), ("close", "ema200")):
+    _ratio_node(f"price_vs_{_b}", _a, _b)
+_ratio_node("ema20_vs_ema50", "ema20", "ema50")
+_ratio_node("ema50_vs_ema200", "ema50", "ema200")
+
+
+@_node("atr_pct", "atr", "close")
+def _atr_pct(atr, close):
+    return atr / close
+
+
+# %K of ta's StochasticOscillator(high, low, close): where the close sits in
+# the 14-bar low–high range (FEATURE_VERSION 1 had the arguments swapped)
+@_node("stoch", "high", "low", "close")
+def _stoch(high, low, close):
+    smin = _rolling(low, 14, "min")
+    smax = _rolling(high, 14, "max")
+    return 100 * (close - smin) / (smax - smin)
+
+
+# Trend strength
+@_node("adx", "directional_movement")
+def _adx(raw):
+    """ta's ADXIndicator.adx(), including its offsets and zero-filled warm-up."""
+    n = _ADX_WINDOW
+    trs, dip, din = _wilder_sums(raw, n)
+    dip = np.where(trs != 0, 100 * dip / trs, 0.0)
+    din = np.where(trs != 0, 100 * din / trs, 0.0)
+    total = dip + din
+    dx = np.where(total != 0, 100 * np.abs((dip - din) / total), 0.0)
+
+    adx = np.zeros_like(dx)
+    adx[n] = dx[:n].mean(axis=0)
+    for i in range(n + 1, len(adx)):
+        adx[i] = (adx[i - 1] * (n - 1) + dx[i - 1]) / n
+    return np.concatenate([np.zeros((n - 1, dx.shape[1])), adx])
+
+
+# Volume
+@_node("volume_ratio", "volume")
+def _volume_ratio(volume):
+    vol_avg = _rolling(volume, 20, "mean")
+    return volume / np.where(vol_avg == 0, np.nan, vol_avg)
+
+
+@_node("obv_slope", "obv")
+def _obv_slope(obv):
+    return _pct_change(obv, 10)
+
+
+# Rate of change: the matching return in percent
+_node("roc_10", "ret_10d")(lambda ret: ret * 100)
+_node("roc_20", "ret_20d")(lambda ret: ret * 100)
+
+
+# Position within 52-week range (scale-invariant)
+@_node("high_52w_ratio", "close")
+def _high_52w_ratio(close):
+    return close / _rolling(close, 252, "max")
+
+
+@_node("low_52w_ratio", "close")
+def _low_52w_ratio(close):
+    return close / _rolling(close, 252, "min")
+
+
+# 12M minus 1M momentum — one of the strongest known quant signals
+# Captures trend while avoiding short-term mean reversion
+@_node("momentum_12m_1m", "ret_252d", "ret_21d")
+def _momentum_12m_1m(ret_252d, ret_21d):
+    return ret_252d - ret_21d
+
+
+# ── evaluation ──────────────────────────────────────────────────────────────
+def _evaluate(inputs: dict[str, np.ndarray], names: list[str]) -> dict[str, np.ndarray]:
+    """Compute `names` from the input matrices, each needed node exactly once."""
+    values = dict(inputs)
+    n_tickers = next(iter(inputs.values())).shape[1]
+
+    def get(name: str) -> np.ndarray:
+        if name not in values:
+            deps, fn = _NODES[name]
+            args = [get(d) for d in deps]
+            # Exclusive cost: dependencies are already evaluated
+            with timed(name, n_tickers):
+                values[name] = fn(*args)
+        return values[name]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {name: get(name) for name in names}
+
+
+def compute_features_panel(data: Mapping, cols: list[str] | None = None) -> dict[str, pd.DataFrame]:
+    """
+    Features for every ticker of a PricePanel (or any ticker → OHLCV mapping)
+    at once: {ticker: DataFrame of `cols`} (default FEATURE_COLS). Only the
+    nodes the requested columns depend on are evaluated. Tickers with fewer
+    than _MIN_PANEL_BARS bars are left out.
+    """
+    cols = list(cols or FEATURE_COLS)
+    unknown = [c for c in cols if c not in _NODES and c not in _DATE_COLS + _EXTERNAL_COLS]
+    if unknown:
+        raise KeyError(f"unknown feature(s): {unknown}")
+
+    frames = {t: df for t, df in data.items() if len(df) >= _MIN_PANEL_BARS}
+    if not frames:
+        return {}
+    lengths = [len(df) for df in frames.values()]
+    n_bars = max(lengths)
+
+    def matrix(field: str) -> np.ndarray:
+        m = np.full((n_bars, len(frames)), np.nan)
+        for j, df in enumerate(frames.values()):
+            m[:lengths[j], j] = df[field].to_numpy(dtype=float)
+        return m
+
+    inputs = {name: matrix(name.capitalize()) for name in _INPUTS}
+    computed = _evaluate(inputs, [c for c in cols if c in _NODES])
+
+    # (feature × bar × ticker); seasonality is per ticker since it depends on
+    # its own dates, macro/RS/cross-section columns stay zero until main.py
+    # fills them
+    block = np.stack([computed.get(c, np.zeros((n_bars, len(frames)))) for c in cols])
+    result = {}
+    for j, (ticker, df) in enumerate(frames.items()):
+        values = block[:, :lengths[j], j].T.copy()
+        if "month" in cols:
+            values[:, cols.index("month")] = df.index.month
+        if "day_of_week" in cols:
+            values[:, cols.index("day_of_week")] = df.index.dayofweek
+        result[ticker] = pd.DataFrame(values, index=df.index, columns=cols)
+    return result
+
+
+def compute_features(df: pd.DataFrame, cols: list[str] | None = None) -> pd.DataFrame:
+    """Features of a single ticker's OHLCV frame (see compute_features_panel)."""
+    if len(df) < _MIN_PANEL_BARS:
+        raise ValueError(f"need at least {_MIN_PANEL_BARS} bars, got {len(df)}")
+    return compute_features_panel({"": df}, cols)[""]
+
+
+# ── instrumentation ─────────────────────────────────────────────────────────
+def enable_profiling():
+    """Start recording node timings/allocations and feature quality for this run."""
+    global _timings
+    _timings = defaultdict(lambda: [0.0, 0, 0, 0])
+    _quality.clear()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+@contextmanager
+def timed(name: str, n_tickers: int):
+    """Add the wall time and allocations of the block to node `name` while profiling."""
+    if _timings is None:
+        yield
+        return
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry = _timings[name]
+        entry[0] += time.perf_counter() - t0
+        entry[1] += tracemalloc.get_traced_memory()[1] - before
+        entry[2] += 1
+        entry[3] += n_tickers
+
+
+def timings() -> dict[str, list] | None:
+    """Node timings recorded so far ({node: [seconds, bytes, evaluations, tickers]}), or None when off."""
+    return None if _timings is None else {k: list(v) for k, v in _timings.items()}
+
+
+def merge_timings(recorded: dict[str, list]):
+    """Add timings recorded in another process (see feature_pool) to this one's."""
+    if _timings is None:
+        return
+    for name, values in recorded.items():
+        entry = _timings[name]
+        for i, v in enumerate(values):
+            entry[i] += v
+
+
+def profile_features(features: Mapping):
+    """Record NaN/inf ratios and constant columns of finished feature frames."""
+    if _timings is None:
+        return
+    for ticker, feat in features.items():
+        values = feat.to_numpy(dtype=float)
+        if not len(values):
+            continue
+        nan = np.isnan(values)
+        inf = np.isinf(values)
+        finite = np.where(nan | inf, np.nan, values)
+        with np.errstate(invalid="ignore"):
+            spread = np.nanmax(finite, axis=0) - np.nanmin(finite, axis=0)
+        for j, col in enumerate(feat.columns):
+            _quality.append({
+                "ticker": ticker, "feature": col, "rows": len(values),
+                "nan_ratio": nan[:, j].mean(), "inf_ratio": inf[:, j].mean(),
+                # all-NaN columns count as constant too
+                "constant": not spread[j] > 0,
+            })
 
-    # Seasonality
-    f["month"] = df.index.month.astype(float)
-    f["day_of_week"] = df.index.dayofweek.astype(float)
 
-    # 12M minus 1M momentum — one of the strongest known quant signals
-    # Captures trend while avoiding short-term mean reversion
-    f["momentum_12m_1m"] = close.pct_change(252) - close.pct_change(21)
+def profile_report() -> pd.DataFrame:
+    """
+    One row per feature or intermediate node: exclusive seconds and allocated
+    MB summed over evaluations, tickers covered, mean NaN/inf ratios, the
+    number of tickers where the column is constant, and `dead` when it is
+    constant for every ticker.
+    """
+    if _timings is None:
+        return pd.DataFrame()
+    timing = pd.DataFrame.from_dict(
+        {k: v for k, v in _timings.items()}, orient="index",
+        columns=["seconds", "alloc_bytes", "evaluations", "tickers"])
+    timing["alloc_mb"] = timing.pop("alloc_bytes") / 1024 ** 2
 
-    # Macro + relative strength — zeroed here, filled in main.py after all data is loaded
-    for col in ["vix_level", "vix_chg_10d", "yield_10y", "yield_chg_20d",
-                "dollar_chg_20d", "rs_20d", "rs_60d"]:
-        f[col] = 0.0
+    if _quality:
+        q = pd.DataFrame(_quality)
+        worst = q.loc[q.groupby("feature")["nan_ratio"].idxmax(), ["feature", "ticker"]]
+        quality = q.groupby("feature").agg(
+            nan_ratio=("nan_ratio", "mean"), inf_ratio=("inf_ratio", "mean"),
+            constant_tickers=("constant", "sum"), profiled_tickers=("ticker", "count"))
+        quality["worst_nan_ticker"] = worst.set_index("feature")["ticker"]
+        quality["dead"] = quality["constant_tickers"] == quality["profiled_tickers"]
+    else:
+        quality = pd.DataFrame()
 
-    return f[FEATURE_COLS]
+    report = timing.join(quality, how="outer")
+    report["kind"] = np.where(report.index.isin(FEATURE_COLS), "feature", "intermediate")
+    report.index.name = "node"
+    return report.reset_index().sort_values("seconds", ascending=False, na_position="last")
@@ -0,0 +1,103 @@
+"""
+Process-pool feature computation over the memory-mapped price panel.
+
+Workers receive the PricePanel by path (see price_panel) and read its pages
+without copying. Each worker computes compute_features_panel() for a chunk
+of tickers and writes the rows as float32 into a shared (ticker × date ×
+feature) output map under CACHE_DIR, so results never travel back as pickled
+DataFrames. The single-process path writes the same chunks into the same
+kind of buffer, which makes both paths produce identical output.
+
+Workers do not share this process's profiling state: while profiling, each
+chunk returns the node timings it recorded and they are merged here.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import feature_engine
+from config import CACHE_DIR, FEATURE_WORKERS, FEATURE_CHUNK
+from feature_engine import FEATURE_COLS, compute_features_panel
+from price_panel import PricePanel
+
+
+def _context():
+    # forkserver: workers fork from a clean, single-threaded server that has
+    # already imported the feature code, rather than from this process (which
+    # has HTTP thread pools running) or from a fresh interpreter per worker
+    ctx = get_context("forkserver")
+    ctx.set_forkserver_preload(["feature_pool"])
+    return ctx
+
+
+def _open_out(path: Path, shape: tuple, mode: str = "r+") -> np.memmap:
+    return np.memmap(path, dtype=np.float32, mode=mode, shape=shape)
+
+
+def _work(panel: PricePanel, out_path: Path, shape: tuple, tickers: list[str]) -> list[str]:
+    """Compute one chunk and write it into the output map. Returns the tickers written."""
+    out = _open_out(out_path, shape)
+    feats = compute_features_panel({t: panel[t] for t in tickers})
+    for ticker, feat in feats.items():
+        out[panel.position(ticker), panel.rows(ticker)] = feat.to_numpy(dtype=np.float32)
+    out.flush()
+    return list(feats)
+
+
+def _pool_work(panel: PricePanel, out_path: Path, shape: tuple, tickers: list[str],
+               profile: bool) -> tuple[list[str], dict]:
+    """_work in a pool worker, plus the node timings of the chunk when `profile` is set."""
+    if profile:
+        feature_engine.enable_profiling()
+    written = _work(panel, out_path, shape, tickers)
+    return written, feature_engine.timings() or {}
+
+
+def compute(panel: PricePanel, tickers: list[str] | None = None,
+            workers: int = FEATURE_WORKERS, chunk: int = FEATURE_CHUNK) -> dict[str, pd.DataFrame]:
+    """
+    compute_features_panel() for `tickers` (default: all) of the panel, in
+    `workers` processes over chunks of `chunk` tickers; workers <= 1 runs the
+    chunks in this process. Feature values are returned as float32.
+    """
+    tickers = [t for t in (tickers if tickers is not None else panel.tickers) if t in panel]
+    if not tickers:
+        return {}
+    shape = (len(panel.tickers), len(panel.dates), len(FEATURE_COLS))
+    out_path = Path(CACHE_DIR) / f"features.{os.getpid()}.f32"
+    out = _open_out(out_path, shape, mode="w+")
+    chunks = [tickers[i:i + chunk] for i in range(0, len(tickers), chunk)]
+    done = []
+    try:
+        if workers > 1 and len(chunks) > 1:
+            profile = feature_engine.timings() is not None
+            recorded = []
+            try:
+                with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                         mp_context=_context()) as pool:
+                    jobs = [(panel, out_path, shape, c, profile) for c in chunks]
+                    for written, timings in pool.map(_pool_work, *zip(*jobs)):
+                        done.extend(written)
+                        recorded.append(timings)
+            except Exception as e:
+                print(f"  Feature pool failed ({e}); computing in one process.")
+                done, recorded = [], []
+            for timings in recorded:
+                feature_engine.merge_timings(timings)
+        if not done:
+            for c in chunks:
+                done.extend(_work(panel, out_path, shape, c))
+
+        result = {}
+        for ticker in done:
+            rows = panel.rows(ticker)
+            values = np.array(out[panel.position(ticker), rows])
+            result[ticker] = pd.DataFrame(values, index=panel.dates[rows], columns=FEATURE_COLS)
+        return result
+    finally:
+        del out
+        out_path.unlink(missing_ok=True)
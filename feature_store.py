@@ -0,0 +1,216 @@
+"""
+Materialized feature rows per ticker, over the append-only price store.
+
+Rows are computed over a ticker's whole stored history rather than the
+DATA_PERIOD window, whose start moves every day: within one price_store
+generation the history only grows at its end, so a row never changes once
+its bar is final. Every ticker gets a directory under FEATURE_STORE_DIR
+holding append-only float32 partitions of its rows and the TickerState
+(see indicator_state) as it stood before the latest bar, which is fed again
+on the next build: a partial bar is revised by the next fetch.
+
+build() streams only the bars a state has not seen and appends their rows.
+A ticker is recomputed from its stored history when its store generation
+changed (a full re-download), its state was built under another
+FEATURE_VERSION or it does not continue the data.
+"""
+import os
+import pickle
+import re
+import tempfile
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import feature_pool
+from config import CACHE_DIR, FEATURE_STORE_DIR
+from data_fetcher import stored_generation, stored_history
+from feature_engine import FEATURE_COLS, compute_features_panel, timed
+from indicator_state import TickerState
+from price_panel import PricePanel
+
+_MAX_PARTITIONS = 32
+
+Path(FEATURE_STORE_DIR).mkdir(parents=True, exist_ok=True)
+
+
+def _ticker_dir(ticker: str) -> Path:
+    return Path(FEATURE_STORE_DIR) / re.sub(r"[^A-Za-z0-9.\-]", "_", ticker)
+
+
+def _partitions(ticker: str) -> list[Path]:
+    return sorted(_ticker_dir(ticker).glob("part_*.npz"))
+
+
+def _atomic_write(path: Path, write):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write(fh)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _write_partition(path: Path, feat: pd.DataFrame):
+    dates = np.asarray(feat.index, dtype="datetime64[ns]").view("int64")
+    values = feat[FEATURE_COLS].to_numpy(dtype=np.float32)
+    _atomic_write(path, lambda fh: np.savez(fh, Date=dates, values=values))
+
+
+def _read_partition(path: Path) -> pd.DataFrame:
+    with np.load(path) as npz:
+        index = pd.DatetimeIndex(npz["Date"].view("datetime64[ns]"), name="Date")
+        return pd.DataFrame(npz["values"], index=index, columns=FEATURE_COLS)
+
+
+def read(ticker: str) -> pd.DataFrame | None:
+    """All stored feature rows of a ticker (float32), or None."""
+    parts = _partitions(ticker)
+    if not parts:
+        return None
+    feat = pd.concat([_read_partition(p) for p in parts])
+    return feat[~feat.index.duplicated(keep="last")].sort_index()
+
+
+def _append(ticker: str, feat: pd.DataFrame):
+    """Append rows as a new partition; later partitions win on overlapping dates."""
+    parts = _partitions(ticker)
+    seq = int(parts[-1].stem.split("_")[1]) + 1 if parts else 0
+    _write_partition(_ticker_dir(ticker) / f"part_{seq:06d}.npz", feat)
+    if len(parts) + 1 > _MAX_PARTITIONS:
+        _replace(ticker, read(ticker))
+
+
+def _replace(ticker: str, feat: pd.DataFrame):
+    folder = _ticker_dir(ticker)
+    folder.mkdir(parents=True, exist_ok=True)
+    old = _partitions(ticker)
+    new = folder / f"part_{int(old[-1].stem.split('_')[1]) + 1 if old else 0:06d}.npz"
+    _write_partition(new, feat)
+    for p in old:
+        p.unlink(missing_ok=True)
+
+
+def _load_state(ticker: str) -> tuple[int, TickerState] | None:
+    try:
+        with open(_ticker_dir(ticker) / "state.pkl", "rb") as fh:
+            return pickle.load(fh)
+    except Exception:
+        return None
+
+
+def _save_state(ticker: str, generation: int, state: TickerState):
+    _atomic_write(_ticker_dir(ticker) / "state.pkl",
+                  lambda fh: pickle.dump((generation, state), fh, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _resume(ticker: str, df: pd.DataFrame) -> tuple[TickerState | None, pd.DataFrame]:
+    """The ticker's stored state and the bars of `df` it has not seen, or (None, df)."""
+    stored = _load_state(ticker)
+    if stored is None:
+        return None, df
+    generation, state = stored
+    if generation != stored_generation(ticker) or not state.matches(df):
+        return None, df
+    return state, df[df.index > state.last_date]
+
+
+def _stream(ticker: str, state: TickerState, new: pd.DataFrame) -> pd.DataFrame:
+    """Feed the new bars, persisting the state before the latest one, and store their rows."""
+    generation = stored_generation(ticker)
+    feat = state.feed_frame(new.iloc[:-1])
+    _save_state(ticker, generation, state)
+    feat = pd.concat([feat, state.feed_frame(new.iloc[-1:])]).astype(np.float32)
+    _append(ticker, feat)
+    return feat
+
+
+def _rebuild(tickers: list[str], data: Mapping) -> dict[str, pd.DataFrame]:
+    """Recompute the tickers over their stored history and replace what is stored for them."""
+    histories = {}
+    for ticker in tickers:
+        history = stored_history(ticker)
+        df = data[ticker]
+        # Without a stored history that ends where the data does (e.g. a
+        # fetch that fell back to the network only) the window is all we have
+        if history is None or history.empty or history.index[-1] != df.index[-1]:
+            history = df
+        histories[ticker] = history
+    if not histories:
+        return {}
+    panel = PricePanel.from_frames(histories, path=Path(CACHE_DIR) / "history.f32")
+    computed = feature_pool.compute(panel)
+
+    result = {}
+    for ticker, feat in computed.items():
+        history = panel[ticker]
+        state = TickerState()
+        state.feed_frame(history.iloc[:-1])
+        _replace(ticker, feat)
+        _save_state(ticker, stored_generation(ticker), state)
+        result[ticker] = feat
+    return result
+
+
+def build(data: Mapping, full: bool = True) -> dict[str, pd.DataFrame]:
+    """
+    Feature frames per ticker of `data`, served from and added to the store.
+    With full=True each frame covers the ticker's whole window; with
+    full=False it holds just the rows of bars the stored state had not seen
+    (the whole window after a rebuild, or when the latest row is not fully
+    finite, so scoring can fall back to the last finite row; see ml_engine).
+    """
+    result, stale = {}, []
+    with timed("feature_store", len(data)):
+        for ticker, df in data.items():
+            try:
+                state, new = _resume(ticker, df)
+                if state is None:
+                    stale.append(ticker)
+                    continue
+                feat = _stream(ticker, state, new)
+                if full or not np.isfinite(feat.iloc[-1].to_numpy()).all():
+                    feat = read(ticker).reindex(df.index)
+                result[ticker] = feat
+            except Exception as e:
+                print(f"  [{ticker}] feature store error: {e}")
+                stale.append(ticker)
+
+    if stale:
+        print(f"  Feature store: recomputing {len(stale)} tickers from their stored history ...")
+        for ticker, feat in _rebuild(stale, data).items():
+            result[ticker] = feat.reindex(data[ticker].index)
+    return result
+
+
+def verify(data: Mapping, tickers: list[str] | None = None, rtol: float = 1e-5) -> dict[str, list[str]]:
+    """
+    Advance the persisted state of each of `tickers` (default: all) over its
+    pending bars without saving and compare the latest row with
+    compute_features_panel() over the stored history. Returns {ticker:
+    [mismatching columns]}; ["no state"] when no state continues the data.
+    """
+    tickers = [t for t in (tickers or list(data)) if t in data]
+    mismatches = {}
+    for ticker in tickers:
+        state, new = _resume(ticker, data[ticker])
+        if state is None:
+            mismatches[ticker] = ["no state"]
+            continue
+        history = stored_history(ticker)
+        if history is None:
+            continue
+        expected = compute_features_panel({ticker: history})[ticker].iloc[-1:]
+        a = expected.replace([np.inf, -np.inf], np.nan).to_numpy(dtype=float)
+        b = state.feed_frame(new).iloc[-1:].to_numpy(dtype=float)
+        ok = np.isclose(a, b, rtol=rtol, atol=rtol, equal_nan=True).all(axis=0)
+        bad = [c for c, good in zip(FEATURE_COLS, ok) if not good]
+        if bad:
+            mismatches[ticker] = bad
+    print(f"  Feature store check: {len(tickers) - len(mismatches)}/{len(tickers)} tickers match full recomputation"
+          + (f"; mismatches: {dict(list(mismatches.items())[:5])}" if mismatches else "."))
+    return mismatches
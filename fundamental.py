@@ -1,27 +1,12 @@
-import pickle
-import time
-from pathlib import Path
-from datetime import date
-
-import yfinance as yf
-
-from config import CACHE_DIR
-
-Path(CACHE_DIR).mkdir(exist_ok=True)
-
-_WEEK = date.today().isocalendar()[1]
-
-
-def _cache_path(ticker: str) -> Path:
-    return Path(CACHE_DIR) / f"fund_{ticker}_w{_WEEK}.pkl"
+from cache import cached
+from executor import run_per_ticker, raise_if_throttled
+from ticker_registry import get_ticker
 
 
+@cached("fundamentals", keep=bool)
 def fetch_fundamentals(ticker: str) -> dict:
-    cache = _cache_path(ticker)
-    if cache.exists():
-        return pickle.load(open(cache, "rb"))
     try:
-        info = yf.Ticker(ticker).info
+        info = get_ticker(ticker).info
         data = {
             "pe_ratio":       info.get("trailingPE"),
             "forward_pe":     info.get("forwardPE"),
@@ -33,9 +18,9 @@ def fetch_fundamentals(ticker: str) -> dict:
             "price_to_book":  info.get("priceToBook"),
             "short_ratio":    info.get("shortRatio"),
         }
-        pickle.dump(data, open(cache, "wb"))
         return data
-    except Exception:
+    except Exception as e:
+        raise_if_throttled(e)
         return {}
 
 
@@ -104,10 +89,4 @@ def score_fundamentals(fund: dict) -> tuple[float, str, str]:
 
 
 def fetch_all_fundamentals(tickers: list[str]) -> dict[str, dict]:
-    result = {}
-    for i, ticker in enumerate(tickers, 1):
-        print(f"  Fundamentals {ticker} ({i}/{len(tickers)})", end="\r")
-        result[ticker] = fetch_fundamentals(ticker)
-        time.sleep(0.05)
-    print()
-    return result
+    return run_per_ticker(fetch_fundamentals, tickers, "Fundamentals", default={})
@@ -1,15 +1,17 @@
-import yfinance as yf
 import pandas as pd
 from ta.trend import EMAIndicator, MACD
 from ta.momentum import RSIIndicator, StochasticOscillator
 from ta.volatility import BollingerBands
 
-def generate_dataset(symbol="AAPL", period="90d", interval="1h", future_window=2, threshold=0.01, output_file="dataset.csv"):
-    data = yf.download(symbol, period=period, interval=interval, progress=False)
+from data_fetcher import load_bars, period_start
 
-    if data.empty or "Close" not in data:
+def generate_dataset(symbol="AAPL", period="90d", interval="1h", future_window=2, threshold=0.01, output_file="dataset.csv"):
+    # Through the shared bar store: incremental downloads, coarser intervals resampled
+    data = load_bars([symbol], interval).get(symbol)
+    if data is None or data.empty or "Close" not in data:
         print(f"No data for {symbol}")
         return
+    data = data[data.index >= period_start(period, end=data.index[-1])].copy()
 
     data.dropna(inplace=True)
 
@@ -18,7 +20,7 @@ def generate_dataset(symbol="AAPL", period="90d", interval="1h", future_window=2
     low = data["Low"]
 
     data["rsi"] = RSIIndicator(close).rsi()
-    data["stoch"] = StochasticOscillator(close, high, low).stoch()
+    data["stoch"] = StochasticOscillator(high, low, close).stoch()
     data["macd_diff"] = MACD(close).macd_diff()
     data["ema20"] = EMAIndicator(close, window=20).ema_indicator()
     data["ema50"] = EMAIndicator(close, window=50).ema_indicator()
@@ -41,5 +43,5 @@ def generate_dataset(symbol="AAPL", period="90d", interval="1h", future_window=2
     dataset.to_csv(output_file, index=False)
     print(f"✅ Dataset saved to {output_file} with {len(dataset)} rows.")
 
-if name == "__main__":
+if __name__ == "__main__":
     generate_dataset(symbol="AAPL")
@@ -0,0 +1,256 @@
+"""
+Streaming indicator kernels for incremental feature updates.
+
+TickerState keeps the recursive state behind every FEATURE_COLS column: EMA
+values, Wilder averages (RSI, ATR, ADX), the OBV running total, monotonic
+deques for the 52-week high/low and short ring buffers for the fixed
+windows. feed() turns each new bar into a feature row in O(1), so a daily
+update costs O(new bars) instead of a recomputation over five years.
+
+States are persisted by feature_store, which feeds them the bars its stored
+history has not seen. matches() tells whether a state can continue a frame:
+its last bar must still be in it, with the same close (the store did not
+re-download adjusted history), before the frame's latest bar and under the
+current FEATURE_VERSION.
+Rows follow compute_features() over the same bars, including ta's warm-up
+zeros for ATR/ADX; a division by zero gives NaN where pandas would give inf
+(both are dropped before training and scoring).
+"""
+import math
+from collections import deque
+
+import pandas as pd
+
+from feature_engine import FEATURE_COLS, FEATURE_VERSION
+
+_NAN = float("nan")
+_TOLERANCE = 1e-6
+
+
+def _div(a: float, b: float) -> float:
+    return a / b if b else _NAN
+
+
+class _Ema:
+    """pandas ewm(adjust=False, min_periods=...).mean() over a stream."""
+
+    def __init__(self, alpha: float, min_periods: int):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.value = _NAN
+        self.count = 0
+
+    def update(self, x: float) -> float:
+        if math.isnan(x):
+            return self.value if self.count >= self.min_periods else _NAN
+        self.value = x if self.count == 0 else self.value + self.alpha * (x - self.value)
+        self.count += 1
+        return self.value if self.count >= self.min_periods else _NAN
+
+
+def _ema(span: int) -> _Ema:
+    return _Ema(2 / (span + 1), span)
+
+
+class _Extreme:
+    """Rolling max (or min) over `window` bars with a monotonic deque."""
+
+    def __init__(self, window: int, largest: bool):
+        self.window = window
+        self.sign = 1 if largest else -1
+        self.deque: deque = deque()     # (bar index, signed value), decreasing
+        self.count = 0
+
+    def update(self, x: float) -> float:
+        i = self.count
+        v = self.sign * x
+        while self.deque and self.deque[-1][1] <= v:
+            self.deque.pop()
+        self.deque.append((i, v))
+        if self.deque[0][0] <= i - self.window:
+            self.deque.popleft()
+        self.count += 1
+        return self.sign * self.deque[0][1] if self.count >= self.window else _NAN
+
+
+class _Rsi:
+    def __init__(self, window: int):
+        self.up = _Ema(1 / window, window)
+        self.down = _Ema(1 / window, window)
+
+    def update(self, diff: float) -> float:
+        # ta maps the undefined first diff to 0 for both legs
+        up = self.up.update(diff if diff > 0 else 0.0)
+        down = self.down.update(-diff if diff < 0 else 0.0)
+        if math.isnan(down):
+            return _NAN
+        return 100.0 if down == 0 else 100 - 100 / (1 + up / down)
+
+
+class _Atr:
+    """ta's AverageTrueRange: 0 for the first n-1 bars, then Wilder smoothing."""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.warmup: list[float] = []
+        self.value = 0.0
+
+    def update(self, tr: float) -> float:
+        if len(self.warmup) < self.n:
+            self.warmup.append(tr)
+            if len(self.warmup) == self.n:
+                self.value = sum(self.warmup) / self.n
+            return self.value
+        self.value = (self.value * (self.n - 1) + tr) / self.n
+        return self.value
+
+
+class _Adx:
+    """ta's ADXIndicator.adx() bar by bar, with its warm-up zeros and offsets."""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.bar = 0
+        self.smooth = [0.0, 0.0, 0.0]     # true range, +DM, -DM
+        self.dx: list[float] = []
+        self.value = 0.0
+
+    def update(self, raw: tuple[float, float, float] | None) -> float:
+        n, p = self.n, self.bar
+        self.bar += 1
+        if p == 0:
+            return 0.0
+        if p <= n:
+            self.smooth = [s + r for s, r in zip(self.smooth, raw)]
+        else:
+            self.smooth = [s - s / n + r for s, r in zip(self.smooth, raw)]
+        if p < n:
+            return 0.0
+
+        trs, dip, din = self.smooth
+        dip = 100 * dip / trs if trs != 0 else 0.0
+        din = 100 * din / trs if trs != 0 else 0.0
+        dx = 100 * abs((dip - din) / (dip + din)) if dip + din != 0 else 0.0
+
+        k = p - n + 1               # position in ta's shortened adx array
+        if k < n:
+            self.dx.append(dx)
+            return 0.0
+        if k == n:
+            self.dx.append(dx)
+            self.value = sum(self.dx) / n
+            self.dx = []
+        else:
+            self.value = (self.value * (n - 1) + dx) / n
+        return self.value
+
+
+class TickerState:
+    """Recursive indicator state of one ticker, advanced one bar at a time."""
+
+    def __init__(self):
+        self.version = FEATURE_VERSION
+        self.last_date: pd.Timestamp | None = None
+        self.last_close = _NAN
+
+        self.closes: deque = deque(maxlen=253)
+        self.bb_window: deque = deque(maxlen=20)
+        self.vol_window: deque = deque(maxlen=20)
+        self.obv_history: deque = deque(maxlen=11)
+        self.prev: tuple[float, float, float] | None = None     # high, low, close
+
+        self.rsi = {w: _Rsi(w) for w in (9, 14, 21)}
+        self.ema = {span: _ema(span) for span in (12, 26, 20, 50, 200)}
+        self.macd_signal = _ema(9)
+        self.atr = _Atr(14)
+        self.adx = _Adx(14)
+        self.obv = 0.0
+        self.high_52w = _Extreme(252, largest=True)
+        self.low_52w = _Extreme(252, largest=False)
+        self.stoch_min = _Extreme(14, largest=False)
+        self.stoch_max = _Extreme(14, largest=True)
+
+    def _back(self, k: int) -> float:
+        return self.closes[-1 - k] if len(self.closes) > k else _NAN
+
+    def feed(self, date: pd.Timestamp, high: float, low: float, close: float, volume: float) -> dict:
+        f = dict.fromkeys(FEATURE_COLS, 0.0)
+        self.closes.append(close)
+        prev_high, prev_low, prev_close = self.prev or (_NAN, _NAN, _NAN)
+
+        for k in (1, 5, 20, 60):
+            f[f"ret_{k}d"] = _div(close, self._back(k)) - 1
+        for w, rsi in self.rsi.items():
+            f[f"rsi_{w}"] = rsi.update(close - prev_close if self.prev else _NAN)
+
+        ema = {span: e.update(close) for span, e in self.ema.items()}
+        macd = ema[12] - ema[26]
+        signal = self.macd_signal.update(macd)
+        f["macd_line"], f["macd_signal"], f["macd_diff"] = macd, signal, macd - signal
+
+        self.bb_window.append(close)
+        if len(self.bb_window) == 20:
+            mavg = sum(self.bb_window) / 20
+            mstd = math.sqrt(sum((x - mavg) ** 2 for x in self.bb_window) / 20)
+            f["bb_pct"] = (close - mavg + 2 * mstd) / (4 * mstd) if mstd else _NAN
+            f["bb_width"] = _div(4 * mstd, mavg) * 100
+        else:
+            f["bb_pct"] = f["bb_width"] = _NAN
+
+        for a, b in ((20, None), (50, None), (200, None), (20, 50), (50, 200)):
+            if b is None:
+                f[f"price_vs_ema{a}"] = _div(close - ema[a], ema[a])
+            else:
+                f[f"ema{a}_vs_ema{b}"] = _div(ema[a] - ema[b], ema[b])
+
+        if self.prev:
+            tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+            dm = max(high, prev_close) - min(low, prev_close)
+            up, down = high - prev_high, prev_low - low
+            raw = (dm, up if up > down and up > 0 else 0.0, down if down > up and down > 0 else 0.0)
+        else:
+            tr, raw = high - low, None
+        f["atr_pct"] = _div(self.atr.update(tr), close)
+        f["adx"] = self.adx.update(raw)
+
+        smin = self.stoch_min.update(low)
+        smax = self.stoch_max.update(high)
+        f["stoch"] = 100 * _div(close - smin, smax - smin)
+
+        self.vol_window.append(volume)
+        vol_avg = sum(self.vol_window) / 20 if len(self.vol_window) == 20 else _NAN
+        f["volume_ratio"] = _div(volume, vol_avg)
+        self.obv += -volume if close < prev_close else volume
+        self.obv_history.append(self.obv)
+        f["obv_slope"] = (_div(self.obv, self.obv_history[0]) - 1
+                          if len(self.obv_history) == 11 else _NAN)
+
+        for w in (10, 20):
+            base = self._back(w)
+            f[f"roc_{w}"] = _div(close - base, base) * 100
+
+        f["high_52w_ratio"] = _div(close, self.high_52w.update(close))
+        f["low_52w_ratio"] = _div(close, self.low_52w.update(close))
+        f["month"] = float(date.month)
+        f["day_of_week"] = float(date.dayofweek)
+        f["momentum_12m_1m"] = (_div(close, self._back(252)) - 1) - (_div(close, self._back(21)) - 1)
+
+        self.prev = (high, low, close)
+        self.last_date, self.last_close = date, close
+        return f
+
+    def feed_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Advance over every bar of an OHLCV frame and return their feature rows."""
+        rows = [self.feed(d, float(h), float(l), float(c), float(v))
+                for d, h, l, c, v in zip(df.index, df["High"], df["Low"], df["Close"], df["Volume"])]
+        return pd.DataFrame(rows, index=df.index, columns=FEATURE_COLS, dtype=float)
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """True if df continues past the history this state was built from, under the current features."""
+        if getattr(self, "version", None) != FEATURE_VERSION:
+            return False
+        if self.last_date is None or self.last_date not in df.index or self.last_date >= df.index[-1]:
+            return False
+        close = float(df.at[self.last_date, "Close"])
+        return abs(close - self.last_close) <= _TOLERANCE * abs(self.last_close)
+
@@ -1,38 +1,18 @@
-import pickle
-from datetime import date
-from pathlib import Path
-
 import pandas as pd
-import yfinance as yf
-
-from config import CACHE_DIR, DATA_PERIOD
-
-Path(CACHE_DIR).mkdir(exist_ok=True)
 
-_MACRO_TICKERS = {"VIX": "^VIX", "TNX": "^TNX", "DXY": "DX-Y.NYB", "SPY": "^GSPC"}
+from market_context import MACRO_TICKERS
 
+MACRO_COLS = ["vix_level", "vix_chg_10d", "yield_10y", "yield_chg_20d", "dollar_chg_20d"]
 
-def _cache_path() -> Path:
-    return Path(CACHE_DIR) / f"macro_{date.today()}.pkl"
-
-
-def fetch_macro() -> dict[str, pd.Series]:
-    cache = _cache_path()
-    if cache.exists():
-        return pickle.load(open(cache, "rb"))
 
+def fetch_macro(context: dict[str, pd.Series]) -> dict[str, pd.Series]:
+    """Pick the macro series (VIX, TNX, DXY, SPY) out of the market context."""
     result = {}
-    for name, ticker in _MACRO_TICKERS.items():
-        try:
-            df = yf.download(ticker, period=DATA_PERIOD, interval="1d",
-                             auto_adjust=True, progress=False)
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
-            result[name] = df["Close"].squeeze()
-        except Exception as e:
-            print(f"  Macro {name} failed: {e}")
-
-    pickle.dump(result, open(cache, "wb"))
+    for name, ticker in MACRO_TICKERS.items():
+        if ticker in context:
+            result[name] = context[ticker]
+        else:
+            print(f"  Macro {name} missing from market context.")
     return result
 
 
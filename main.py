@@ -6,16 +6,21 @@ import schedule
 import time
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 
 from config import (
     US_STOCKS, DE_STOCKS, CRYPTO, ETFS, SECTOR_MAP,
-    TICKER_NAMES, DB_PATH, TOP_N, DAILY_RUN_TIME,
+    TICKER_NAMES, DB_PATH, PICKS_PATH, TOP_N, DAILY_RUN_TIME, INDICATOR_VERIFY,
+    FEATURE_PROFILE, RETRAIN_MODE,
 )
-from data_fetcher import fetch_all
+from data_fetcher import fetch_all, STALE
+from price_panel import PricePanel
+import feature_engine
 from feature_engine import compute_features, FEATURE_COLS
-from ml_engine import train_models, load_models, predict, feature_count_matches
-from macro_features import fetch_macro, build_macro_df
+from ml_engine import train_models, update_models, load_models, predict, feature_count_matches
+from macro_features import fetch_macro, build_macro_df, MACRO_COLS
+from market_context import load_context
 from fundamental import fetch_all_fundamentals, score_fundamentals
 from sentiment import get_all_sentiments
 from insider import get_all_insider_signals
@@ -25,6 +30,12 @@ from options_sentiment import get_all_pc_ratios
 from market_regime import detect_regime, compute_sector_momentum, sector_boost
 from outcome_tracker import save_prediction_prices, update_outcomes
 from notifier import send_daily_digest
+import cache
+from calendar_align import Aligner, gather, pct_change
+import cross_section
+import feature_store
+import ticker_registry
+import provider
 
 
 def _asset_type(ticker: str) -> str:
@@ -34,47 +45,70 @@ def _asset_type(ticker: str) -> str:
     return "Crypto"
 
 
-def _benchmark_for(ticker: str, prices: dict) -> pd.Series | None:
-    """Return the benchmark price series for computing relative strength."""
+def _benchmark_for(ticker: str, prices: dict, context: dict) -> tuple[str, pd.Series] | None:
+    """Return (benchmark ticker, price series) for computing relative strength."""
     etf = SECTOR_MAP.get(ticker)
-    if etf and etf in prices:
-        return prices[etf]
-    if ticker in DE_STOCKS and "EWG" in prices:
-        return prices["EWG"]
+    if etf and etf in context:
+        return etf, context[etf]
+    if ticker in DE_STOCKS and "EWG" in context:
+        return "EWG", context["EWG"]
     if ticker in CRYPTO and "BTC-USD" in prices and ticker != "BTC-USD":
-        return prices["BTC-USD"]
+        return "BTC-USD", prices["BTC-USD"]
     return None
 
 
-def _build_features(data: dict, macro_data: dict) -> tuple[dict, dict]:
+def _build_features(data: PricePanel, macro_data: dict, context: dict,
+                    full: bool = True) -> tuple[dict, dict]:
+    """
+    Feature frames per ticker, served from the feature store. With full=False
+    (scoring only) they hold just the rows for new bars.
+    """
     features, prices = {}, {}
-    all_dates = pd.DatetimeIndex(sorted(set().union(*[df.index for df in data.values()])))
-    macro_df = build_macro_df(macro_data, all_dates)
+    macro_df = build_macro_df(macro_data, data.dates)
+    macro_cols = [c for c in MACRO_COLS if c in macro_df.columns]
+    macro_values = macro_df[macro_cols].to_numpy()
+    aligner = Aligner()
+
+    try:
+        panel_features = feature_store.build(data, full=full)
+        if not full and INDICATOR_VERIFY:
+            feature_store.verify(data)
+    except Exception as e:
+        print(f"  Feature engine failed ({e}); computing per ticker.")
+        panel_features = {}
 
     for ticker, df in data.items():
         try:
-            feat = compute_features(df)
+            feat = panel_features.get(ticker)
+            if feat is None:
+                feat = compute_features(df)
 
-            # Inject macro features (aligned by date)
-            for col in ["vix_level", "vix_chg_10d", "yield_10y", "yield_chg_20d", "dollar_chg_20d"]:
-                if col in macro_df.columns:
-                    feat[col] = macro_df[col].reindex(feat.index, method="ffill")
+            # Inject macro features (one gather per calendar-aligned block)
+            pos = aligner.positions("macro", macro_df.index, feat.index)
+            feat[macro_cols] = gather(macro_values, pos)
 
             features[ticker] = feat
-            prices[ticker] = df["Close"].squeeze()
+            prices[ticker] = data.close(ticker)
         except Exception as e:
             print(f"  [{ticker}] feature error: {e}")
 
-    # Relative strength vs sector (vectorized per ticker)
+    # Relative strength vs sector: the benchmark is aligned once per calendar
     for ticker, feat in features.items():
-        bench = _benchmark_for(ticker, prices)
+        bench = _benchmark_for(ticker, prices, context)
         stock = prices.get(ticker)
         if bench is not None and stock is not None:
-            bench_aligned = bench.reindex(stock.index, method="ffill")
-            rs20 = stock.pct_change(20) - bench_aligned.pct_change(20)
-            rs60 = stock.pct_change(60) - bench_aligned.pct_change(60)
-            feat["rs_20d"] = rs20.reindex(feat.index, method="ffill")
-            feat["rs_60d"] = rs60.reindex(feat.index, method="ffill")
+            name, series = bench
+            bench_aligned = aligner.align(name, series, stock.index)
+            close = stock.to_numpy(dtype=float)
+            rs = np.column_stack([pct_change(close, k) - pct_change(bench_aligned, k) for k in (20, 60)])
+            rows = aligner.positions(ticker, stock.index, feat.index)
+            feat[["rs_20d", "rs_60d"]] = gather(rs, rows)
+
+    # Cross-sectional ranks need every ticker's frame, so they come last
+    try:
+        cross_section.add_features(features, {t: _asset_type(t) for t in features})
+    except Exception as e:
+        print(f"  Cross-sectional features failed: {e}")
 
     return features, prices
 
@@ -161,6 +195,28 @@ def _save(predictions: pd.DataFrame):
     conn.close()
 
 
+def _save_feature_report(report: pd.DataFrame):
+    """Store the feature profiling report next to the predictions and print the highlights."""
+    if report.empty:
+        return
+    df = report.copy()
+    df["timestamp"] = datetime.now().strftime("%Y-%m-%d")
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        df.to_sql("feature_report", conn, if_exists="append", index=False)
+    except Exception:
+        conn.execute("DROP TABLE IF EXISTS feature_report")
+        df.to_sql("feature_report", conn, if_exists="replace", index=False)
+    conn.close()
+
+    hot = report.dropna(subset=["seconds"]).head(3)
+    print("  Slowest nodes: " + ", ".join(f"{r.node} {r.seconds:.2f}s" for r in hot.itertuples()))
+    if "dead" in report:
+        dead = report.loc[report["dead"].fillna(False).astype(bool), "node"].tolist()
+        if dead:
+            print(f"  Dead features (constant for every ticker): {', '.join(dead)}")
+
+
 def _print_results(predictions: pd.DataFrame, regime: dict):
     print(f"\n  Market: {regime.get('regime','?')} | "
           f"S&P vs 200MA: {regime.get('spy_vs_200ma', 0):+.1f}%")
@@ -332,11 +388,14 @@ def _export_picks_json(predictions: pd.DataFrame, regime: dict, prices: dict):
             "reasons":      _build_reasons(row),
             "signals":      _build_signals(row),
             "recommendation": _recommendation(score_out, signal),
+            # Downloads failed today — scored on the last good stored prices
+            "stale":        ticker in STALE,
+            "dataAsOf":     price_s.index[-1].strftime("%Y-%m-%d"),
         })
     # Read yesterday's picks BEFORE overwriting — for daily diff.
     previous_picks = []
     try:
-        with open("picks.json", encoding="utf-8") as f:
+        with open(PICKS_PATH, encoding="utf-8") as f:
             previous_picks = json.load(f).get("picks", [])
     except (FileNotFoundError, json.JSONDecodeError):
         pass
@@ -350,9 +409,11 @@ def _export_picks_json(predictions: pd.DataFrame, regime: dict, prices: dict):
         },
         "picks": picks_out,
     }
-    with open("picks.json","w",encoding="utf-8") as f:
+    with open(PICKS_PATH,"w",encoding="utf-8") as f:
         json.dump(output, f, ensure_ascii=False)
-    print(f"  Exported {len(picks_out)} picks → picks.json")
+    stale = [p["ticker"] for p in picks_out if p["stale"]]
+    print(f"  Exported {len(picks_out)} picks → {PICKS_PATH}"
+          + (f" ({len(stale)} on stale data: {', '.join(stale[:10])})" if stale else ""))
 
     # Diff against yesterday and trigger Web Push to subscribed users.
     _notify_recommendation_changes(picks_out, previous_picks)
@@ -398,20 +459,18 @@ def _notify_recommendation_changes(new_picks: list, previous_picks: list) -> Non
     print(f"  {len(changes)} ticker(s) flipped: {summary}{' ...' if len(changes) > 10 else ''}")
 
     try:
-        import urllib.request
-        req = urllib.request.Request(
-            f"{api_url}/api/admin/notify-changes",
-            data=json.dumps({"changes": changes}).encode("utf-8"),
-            headers={"Content-Type": "application/json", "X-Admin-Token": admin_token},
-            method="POST",
+        status, body = provider.http_post(
+            f"{api_url}/api/admin/notify-changes", {"changes": changes},
+            headers={"X-Admin-Token": admin_token}, timeout=30,
         )
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            body = resp.read().decode("utf-8")
-            try:
-                result = json.loads(body)
-                print(f"  Worker: sent={result.get('sent', 0)} failed={result.get('failed', 0)}")
-            except json.JSONDecodeError:
-                print(f"  Worker: {body[:200]}")
+        if status >= 400:
+            print(f"  Push notify failed: HTTP {status} {body[:200]}")
+            return
+        try:
+            result = json.loads(body)
+            print(f"  Worker: sent={result.get('sent', 0)} failed={result.get('failed', 0)}")
+        except json.JSONDecodeError:
+            print(f"  Worker: {body[:200]}")
     except Exception as e:
         print(f"  Push notify failed: {e}")
 
@@ -420,28 +479,41 @@ def run():
     print(f"\n{'='*65}")
     print(f"  Stock Analyzer — {datetime.now().strftime('%Y-%m-%d %H:%M')}")
     print(f"{'='*65}")
+    provider.begin_run()
+    ticker_registry.reset()
 
-    print("\n[1/8] Detecting market regime...")
-    regime = detect_regime()
+    print("\n[1/8] Loading market context & detecting regime...")
+    context = load_context()
+    regime = detect_regime(context)
     print(f"  {regime['regime']} | S&P vs 200MA: {regime['spy_vs_200ma']:+.1f}%")
 
     print("\n[2/8] Fetching market + macro data...")
     data = fetch_all()
-    macro_data = fetch_macro()
+    macro_data = fetch_macro(context)
     if not data:
         print("No data fetched. Aborting.")
         return
 
-    print("\n[3/8] Computing features (technical + macro + relative strength)...")
-    features, prices = _build_features(data, macro_data)
-    print(f"  Features ready for {len(features)} assets ({len(FEATURE_COLS)} features each).")
-
-    if _should_retrain():
+    retrain = _should_retrain()
+    print("\n[3/8] Computing features (technical + macro + relative strength + cross-section)...")
+    if FEATURE_PROFILE:
+        feature_engine.enable_profiling()
+    features, prices = _build_features(data, macro_data, context, full=retrain)
+    if FEATURE_PROFILE:
+        feature_engine.profile_features(features)
+        _save_feature_report(feature_engine.profile_report())
+    print(f"  Features ready for {len(features)} assets ({len(FEATURE_COLS)} features each"
+          + ("" if retrain else ", streamed") + ").")
+
+    if retrain and RETRAIN_MODE == "incremental":
+        print("\n[4/8] Updating LightGBM + XGBoost ensemble (warm start)...")
+        models = update_models(features, prices)
+    elif retrain:
         print("\n[4/8] Training LightGBM + XGBoost ensemble...")
         models = train_models(features, prices)
     else:
         print("\n[4/8] Loading existing ML models...")
-        models = load_models()
+        models = load_models(compiled=True)
 
     if not models:
         print("No models available. Aborting.")
@@ -457,7 +529,7 @@ def run():
     print("\n[6/8] Fetching fundamentals, sentiment & sector momentum...")
     fundamentals = fetch_all_fundamentals(tickers)
     sentiments   = get_all_sentiments(tickers)
-    sector_mom   = compute_sector_momentum()
+    sector_mom   = compute_sector_momentum(context)
 
     print("\n[7/8] Fetching insider signals, analyst ratings, options & earnings...")
     insiders      = get_all_insider_signals(tickers)
@@ -479,6 +551,8 @@ def run():
     _print_results(predictions, regime)
     send_daily_digest(predictions, regime)
     _export_picks_json(predictions, regime, prices)
+    cache.report()
+    provider.report()
     print(f"\nDone. Next scheduled run at {DAILY_RUN_TIME}.")
 
 
@@ -0,0 +1,22 @@
+"""
+Market context: index, macro and sector ETF series in one batched load.
+
+Regime detection, sector momentum, macro features and relative-strength
+benchmarks all read from the dict returned by load_context(). The series go
+through the same incremental price store as the asset universe, so a daily
+run fetches them with a single request.
+"""
+import pandas as pd
+
+from config import SECTOR_ETFS
+from data_fetcher import download_group
+
+SP500 = "^GSPC"
+MACRO_TICKERS = {"VIX": "^VIX", "TNX": "^TNX", "DXY": "DX-Y.NYB", "SPY": SP500}
+CONTEXT_TICKERS = list(dict.fromkeys([*MACRO_TICKERS.values(), *SECTOR_ETFS]))
+
+
+def load_context() -> dict[str, pd.Series]:
+    """Return {ticker: Close series} for every context ticker that could be loaded."""
+    frames = download_group("Market context", CONTEXT_TICKERS, min_rows=1)
+    return {t: df["Close"].dropna() for t, df in frames.items() if "Close" in df}
@@ -1,17 +1,13 @@
 import pandas as pd
-import yfinance as yf
 
 from config import SECTOR_ETFS, CRYPTO
+from market_context import SP500
 
 
-def detect_regime() -> dict:
+def detect_regime(context: dict[str, pd.Series]) -> dict:
     """Detect S&P 500 bull/bear regime using 50/200 EMA cross."""
     try:
-        df = yf.download("^GSPC", period="2y", interval="1d",
-                         progress=False, auto_adjust=True)
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-        close = df["Close"].squeeze()
+        close = context[SP500]
         ema50 = close.ewm(span=50).mean()
         ema200 = close.ewm(span=200).mean()
         current = float(close.iloc[-1])
@@ -33,16 +29,12 @@ def detect_regime() -> dict:
                 "mom_1m": 0, "score_multiplier": 1.0}
 
 
-def compute_sector_momentum() -> dict[str, float]:
+def compute_sector_momentum(context: dict[str, pd.Series]) -> dict[str, float]:
     """Return (price - EMA50) / EMA50 for each sector ETF."""
     momentum = {}
     for etf in SECTOR_ETFS:
         try:
-            df = yf.download(etf, period="1y", interval="1d",
-                             progress=False, auto_adjust=True)
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
-            close = df["Close"].squeeze()
+            close = context[etf]
             ema50 = close.ewm(span=50).mean()
             mom = (float(close.iloc[-1]) - float(ema50.iloc[-1])) / float(ema50.iloc[-1])
             momentum[etf] = round(mom, 4)
@@ -1,18 +1,26 @@
+import hashlib
 import os
 import joblib
+from joblib import Parallel, delayed
 import numpy as np
 import pandas as pd
-import lightgbm as lgb
-import xgboost as xgb
 from pathlib import Path
-from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import TimeSeriesSplit
-from sklearn.metrics import roc_auc_score
 
-from config import HORIZONS, GAIN_THRESHOLDS, MODEL_DIR
-from feature_engine import FEATURE_COLS
+from config import (
+    HORIZONS, GAIN_THRESHOLDS, MODEL_DIR, TRAIN_WORKERS, TRAIN_THREADS,
+    WARM_START_DAYS, WARM_START_ROUNDS, WARM_START_MIN_ROWS, WARM_START_AUC_DROP,
+    WARM_START_MAX_UPDATES,
+)
+from feature_engine import FEATURE_COLS, FEATURE_VERSION
+import cache
+import tree_ensemble
+
+# lightgbm, xgboost and sklearn are imported where models are fitted: a
+# predict-only run scores the compiled ensembles (tree_ensemble) with NumPy
+
+Path(MODEL_DIR).mkdir(parents=True, exist_ok=True)
 
-Path(MODEL_DIR).mkdir(exist_ok=True)
+_FEATURE_INDEX = pd.Index(FEATURE_COLS)
 
 _LGB_PARAMS = dict(
     n_estimators=300,
@@ -42,8 +50,9 @@ def _xgb_params(pos: int, neg: int) -> dict:
 
 
 def _make_labels(close: pd.Series, horizon_days: int, threshold: float) -> pd.Series:
+    """1/0 for a gain of at least `threshold` over `horizon_days`; NaN while that future is unknown."""
     future_return = close.shift(-horizon_days) / close - 1
-    return (future_return >= threshold).astype(int)
+    return (future_return >= threshold).astype(float).where(future_return.notna())
 
 
 def _pool_data(
@@ -51,75 +60,203 @@ def _pool_data(
     price_by_ticker: dict[str, pd.Series],
     horizon_days: int,
     threshold: float,
-) -> tuple[pd.DataFrame, pd.Series]:
-    rows = []
+    since: pd.Timestamp | None = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pool every ticker's labelled rows (dated `since` or later, if given) into
+    one contiguous float32 matrix, ordered by date (stable across tickers),
+    plus int8 labels and the sorted row dates.
+
+    A first pass only builds the per-ticker validity masks and labels, so the
+    matrix is allocated once at its final size and each ticker's rows are
+    written straight to their date-ordered positions.
+    """
+    kept = []           # (features, validity mask, labels)
     for ticker, feat in features_by_ticker.items():
         close = price_by_ticker[ticker]
-        labels = _make_labels(close, horizon_days, threshold)
-        merged = feat[FEATURE_COLS].copy()
-        merged["label"] = labels
-        # Replace inf/-inf before dropping NaN — XGBoost crashes on inf
-        merged.replace([np.inf, -np.inf], np.nan, inplace=True)
-        merged.dropna(inplace=True)
-        if len(merged) < 100 or merged["label"].sum() < 15:
+        labels = _make_labels(close, horizon_days, threshold).reindex(feat.index)
+        values = feat[FEATURE_COLS].to_numpy()
+        # inf/-inf count as missing — XGBoost crashes on inf
+        valid = np.isfinite(values).all(axis=1) & labels.notna().to_numpy()
+        if since is not None:
+            valid &= feat.index >= since
+        n_valid = int(valid.sum())
+        y_valid = labels.to_numpy()[valid]
+        if n_valid < 100 or y_valid.sum() < 15:
             continue
-        rows.append(merged)
+        kept.append((feat, valid, y_valid))
 
-    if not rows:
-        return pd.DataFrame(), pd.Series(dtype=int)
+    if not kept:
+        return (np.empty((0, len(FEATURE_COLS)), dtype=np.float32), np.empty(0, dtype=np.int8),
+                np.empty(0, dtype="datetime64[ns]"))
+
+    dates = np.concatenate([feat.index.to_numpy(dtype="datetime64[ns]")[valid]
+                            for feat, valid, _ in kept])
+    # Destination row of each pooled row in date order
+    order = np.argsort(dates, kind="stable")
+    dest = np.empty(len(dates), dtype=np.int64)
+    dest[order] = np.arange(len(dates))
+
+    X = np.empty((len(dates), len(FEATURE_COLS)), dtype=np.float32)
+    y = np.empty(len(dates), dtype=np.int8)
+    offset = 0
+    for feat, valid, y_valid in kept:
+        rows = dest[offset:offset + len(y_valid)]
+        X[rows] = feat[FEATURE_COLS].to_numpy()[valid]
+        y[rows] = y_valid
+        offset += len(y_valid)
+    return X, y, dates[order]
+
+
+def _span(idx: np.ndarray) -> slice:
+    """TimeSeriesSplit folds are contiguous: slice them instead of copying."""
+    return slice(int(idx[0]), int(idx[-1]) + 1)
+
+
+def _fit(kind: str, X: np.ndarray, y: np.ndarray, fit_on: slice, predict_on: slice | None,
+         threads: int):
+    """
+    One LightGBM ("lgb") or XGBoost ("xgb") fit on X[fit_on] with `threads`
+    cores. Returns (model, P(up) for X[predict_on] or None).
+    """
+    import lightgbm as lgb
+    import xgboost as xgb
+
+    X_tr, y_tr = X[fit_on], y[fit_on]
+    if kind == "lgb":
+        model = lgb.LGBMClassifier(**_LGB_PARAMS, n_jobs=threads)
+    else:
+        pos = int(y_tr.sum())
+        model = xgb.XGBClassifier(**_xgb_params(pos, len(y_tr) - pos), n_jobs=threads)
+    model.fit(X_tr, y_tr)
+    oof = model.predict_proba(X[predict_on])[:, 1] if predict_on is not None else None
+    # Cached and saved models score with every core again
+    return model.set_params(n_jobs=None), oof
+
+
+def _fold_digest(kind: str, X: np.ndarray, y: np.ndarray, fit_on: slice, predict_on: slice | None) -> str:
+    """Hash of everything a fit depends on: model, parameters, library versions and rows."""
+    import lightgbm as lgb
+    import xgboost as xgb
+
+    h = hashlib.sha1(repr((kind, _LGB_PARAMS, _xgb_params(0, 0), FEATURE_COLS,
+                           lgb.__version__, xgb.__version__)).encode("utf-8"))
+    h.update(X[fit_on])
+    h.update(y[fit_on])
+    if predict_on is not None:
+        h.update(X[predict_on])
+    return h.hexdigest()
+
+
+def _run_fits(jobs: list[tuple], data: dict, workers: int, threads: int) -> dict:
+    """
+    Fold artifacts {(horizon, kind, fold): (model, OOF predictions)} for every
+    (horizon, kind, fold, fit_on, predict_on) job. A job is served from the
+    "folds" cache when the same fit already ran on identical rows; the rest
+    are fitted, in loky processes when workers > 1, and written through.
+    """
+    artifacts, todo, digests = {}, [], {}
+    for job in jobs:
+        label, kind, fold, fit_on, predict_on = job
+        name = f"{label}_{kind}_{'all' if fold is None else fold}"
+        digest = _fold_digest(kind, *data[label][:2], fit_on, predict_on)
+        hit = cache.get("folds", name)
+        if hit is not None and hit[0] == digest:
+            artifacts[job[:3]] = hit[1]
+        else:
+            todo.append(job)
+            digests[job[:3]] = (name, digest)
 
-    combined = pd.concat(rows).sort_index()
-    return combined[FEATURE_COLS], combined["label"]
+    n_jobs = max(1, min(workers, len(todo)))
+    per_job = max(1, threads // n_jobs)
+
+    def tasks():
+        return (delayed(_fit)(kind, *data[label][:2], fit_on, predict_on, per_job)
+                for label, kind, _, fit_on, predict_on in todo)
+
+    results = None
+    if n_jobs > 1:
+        try:
+            print(f"  Training {len(todo)} fits in {n_jobs} processes × {per_job} threads...")
+            results = Parallel(n_jobs=n_jobs, backend="loky")(tasks())
+        except Exception as e:
+            print(f"  Training pool failed ({e}); fitting in one process.")
+    if results is None:
+        results = [fn(*args, **kwargs) for fn, args, kwargs in tasks()]
+
+    for job, artifact in zip(todo, results):
+        artifacts[job[:3]] = artifact
+        name, digest = digests[job[:3]]
+        try:
+            cache.put("folds", name, (digest, artifact))
+        except Exception as e:
+            print(f"  [{name}] fold cache write failed: {e}")
+    print(f"  Fold artifacts: {len(jobs) - len(todo)} reused, {len(todo)} trained.")
+    return artifacts
 
 
 def train_models(
     features_by_ticker: dict[str, pd.DataFrame],
     price_by_ticker: dict[str, pd.Series],
+    workers: int = TRAIN_WORKERS,
+    threads: int = TRAIN_THREADS,
+    labels: list[str] | None = None,
 ) -> dict:
-    models = {}
+    """
+    Stacked LGB + XGB ensemble per horizon (`labels`, default all of
+    HORIZONS). The base-model fits of all horizons (LGB and XGB per
+    walk-forward fold, then both on all rows) are independent jobs, run
+    largest first across `workers` processes sharing `threads` cores. Each
+    fit sees the same rows and seeds either way, so the models match serial
+    training exactly.
+
+    Every (horizon, fold, model) is fitted once: its fold artifact (model and
+    OOF predictions) gives both the walk-forward AUC and the meta-learner
+    inputs, and is reused from the cache while the fold's rows are unchanged.
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import TimeSeriesSplit
+    from sklearn.metrics import roc_auc_score
+
+    data, jobs = {}, []
     for label, horizon_days in HORIZONS.items():
+        if labels is not None and label not in labels:
+            continue
         threshold = GAIN_THRESHOLDS[label]
         print(f"\n[{label}] Building training data (horizon={horizon_days}d, threshold={threshold*100:.0f}%)...")
-        X, y = _pool_data(features_by_ticker, price_by_ticker, horizon_days, threshold)
+        X, y, dates = _pool_data(features_by_ticker, price_by_ticker, horizon_days, threshold)
 
-        if X.empty:
+        if len(X) == 0:
             print(f"[{label}] Not enough data — skipping.")
             continue
 
-        pos = int(y.sum())
-        neg = int(len(y) - pos)
         print(f"[{label}] {len(X):,} rows | positive rate: {y.mean():.1%}")
+        folds = [(_span(tr), _span(vl)) for tr, vl in TimeSeriesSplit(n_splits=3).split(X)]
+        data[label] = (X, y, folds, pd.Timestamp(dates[-1]))
+        for i, (tr, vl) in enumerate(folds):
+            jobs += [(label, "lgb", i, tr, vl), (label, "xgb", i, tr, vl)]
+        everything = slice(0, len(X))
+        jobs += [(label, "lgb", None, everything, None), (label, "xgb", None, everything, None)]
+
+    jobs.sort(key=lambda job: job[3].stop - job[3].start, reverse=True)
+    artifacts = _run_fits(jobs, data, workers, threads)
 
-        # Walk-forward AUC using LightGBM (fast proxy for ensemble quality)
-        tscv = TimeSeriesSplit(n_splits=3)
+    models = {}
+    for label, (X, y, folds, trained_through) in data.items():
+        # ── Stacking: out-of-fold predictions for the meta-learner ─────────
+        lgb_oof = np.zeros(len(y))
+        xgb_oof = np.zeros(len(y))
         aucs = []
-        for train_idx, val_idx in tscv.split(X):
-            X_tr, X_val = X.iloc[train_idx], X.iloc[val_idx]
-            y_tr, y_val = y.iloc[train_idx], y.iloc[val_idx]
-            if y_val.nunique() < 2:
-                continue
-            m = lgb.LGBMClassifier(**_LGB_PARAMS)
-            m.fit(X_tr, y_tr)
-            aucs.append(roc_auc_score(y_val, m.predict_proba(X_val)[:, 1]))
+        for i, (_, vl) in enumerate(folds):
+            lgb_oof[vl] = artifacts[label, "lgb", i][1]
+            xgb_oof[vl] = artifacts[label, "xgb", i][1]
+            # Walk-forward AUC using LightGBM (fast proxy for ensemble quality)
+            if len(np.unique(y[vl])) == 2:
+                aucs.append(roc_auc_score(y[vl], lgb_oof[vl]))
 
         mean_auc = np.mean(aucs) if aucs else 0.0
         print(f"[{label}] Walk-forward AUC: {mean_auc:.3f} ± {np.std(aucs):.3f}")
 
-        # ── Stacking: generate out-of-fold predictions for meta-learner ──────
-        tscv_stack = TimeSeriesSplit(n_splits=3)
-        lgb_oof = np.zeros(len(y))
-        xgb_oof = np.zeros(len(y))
-        for tr_idx, vl_idx in tscv_stack.split(X):
-            X_tr, X_vl = X.iloc[tr_idx], X.iloc[vl_idx]
-            y_tr = y.iloc[tr_idx]
-            pos_tr = int(y_tr.sum()); neg_tr = int(len(y_tr) - pos_tr)
-            m_lgb = lgb.LGBMClassifier(**_LGB_PARAMS)
-            m_lgb.fit(X_tr, y_tr)
-            lgb_oof[vl_idx] = m_lgb.predict_proba(X_vl)[:, 1]
-            m_xgb = xgb.XGBClassifier(**_xgb_params(pos_tr, neg_tr))
-            m_xgb.fit(X_tr, y_tr)
-            xgb_oof[vl_idx] = m_xgb.predict_proba(X_vl)[:, 1]
-
         meta = LogisticRegression(random_state=42, max_iter=500)
         meta.fit(np.column_stack([lgb_oof, xgb_oof]), y)
         meta_auc = roc_auc_score(y, meta.predict_proba(
@@ -127,71 +264,250 @@ def train_models(
         print(f"[{label}] Stacking meta AUC (OOF): {meta_auc:.3f}")
 
         # ── Final base models trained on all data ─────────────────────────
-        lgb_model = lgb.LGBMClassifier(**_LGB_PARAMS)
-        lgb_model.fit(X, y)
-        xgb_model = xgb.XGBClassifier(**_xgb_params(pos, neg))
-        xgb_model.fit(X, y)
+        lgb_model = artifacts[label, "lgb", None][0]
+        xgb_model = artifacts[label, "xgb", None][0]
 
         importance = pd.Series(lgb_model.feature_importances_, index=FEATURE_COLS)
         top5 = importance.nlargest(5).index.tolist()
         print(f"[{label}] Top features: {', '.join(top5)}")
 
-        ensemble = {"lgb": lgb_model, "xgb": xgb_model, "meta": meta}
-        path = os.path.join(MODEL_DIR, f"model_{label}.pkl")
-        joblib.dump(ensemble, path)
-        print(f"[{label}] Stacked ensemble saved to {path}")
+        ensemble = {"lgb": lgb_model, "xgb": xgb_model, "meta": meta,
+                    "features": list(FEATURE_COLS), "feature_version": FEATURE_VERSION,
+                    "trained_through": trained_through, "updates": 0}
+        _save_ensemble(label, ensemble, X)
         models[label] = ensemble
 
     return models
 
 
-def load_models() -> dict:
+def _current(features: list[str] | None, feature_version: int | None) -> bool:
+    """True for models trained on exactly the current FEATURE_COLS and FEATURE_VERSION."""
+    return list(features or []) == FEATURE_COLS and feature_version == FEATURE_VERSION
+
+
+def _save_ensemble(label: str, ensemble: dict, X: np.ndarray):
+    """Pickle an ensemble and export its compiled form, checked on up to 2,000 rows of X."""
+    path = os.path.join(MODEL_DIR, f"model_{label}.pkl")
+    joblib.dump(ensemble, path)
+    print(f"[{label}] Stacked ensemble saved to {path}")
+    sample = X[np.linspace(0, len(X) - 1, min(len(X), 2000)).astype(int)]
+    tree_ensemble.export(label, ensemble, sample)
+
+
+def _continue(kind: str, model, X: np.ndarray, y: np.ndarray, threads: int):
+    """A copy of `model` boosted WARM_START_ROUNDS more rounds on X, y."""
+    import lightgbm as lgb
+    import xgboost as xgb
+
+    if kind == "lgb":
+        params = {**_LGB_PARAMS, "n_estimators": WARM_START_ROUNDS}
+        new = lgb.LGBMClassifier(**params, n_jobs=threads)
+        new.fit(X, y, init_model=model.booster_)
+    else:
+        pos = int(y.sum())
+        params = {**_xgb_params(pos, len(y) - pos), "n_estimators": WARM_START_ROUNDS}
+        new = xgb.XGBClassifier(**params, n_jobs=threads)
+        new.fit(X, y, xgb_model=model.get_booster())
+    return new.set_params(n_jobs=None)
+
+
+def _warm_start(label: str, ensemble: dict, features_by_ticker: dict, price_by_ticker: dict,
+                since: pd.Timestamp, threads: int) -> dict | None:
+    """
+    Continue a saved ensemble on the labelled rows since `since`.
+
+    Rows labelled after the ensemble's `trained_through` date are unseen by
+    it, so they are the holdout: a candidate continued on the older window
+    rows must score an AUC there no more than WARM_START_AUC_DROP below the
+    saved boosters, and the meta-learner is refitted on its holdout
+    predictions (reweighted to the window's positive rate). The boosters are
+    then continued on the whole window and the result saved. While fewer than
+    WARM_START_MIN_ROWS new rows exist the boosters are kept, but the skip
+    still counts toward WARM_START_MAX_UPDATES. Returns None when the horizon
+    should be rebuilt.
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import roc_auc_score
+
+    X, y, dates = _pool_data(features_by_ticker, price_by_ticker,
+                             HORIZONS[label], GAIN_THRESHOLDS[label], since=since)
+    cut = int(np.searchsorted(dates, np.datetime64(ensemble["trained_through"]), side="right"))
+    X_ho, y_ho = X[cut:], y[cut:]
+    if len(y_ho) < WARM_START_MIN_ROWS or len(np.unique(y_ho)) < 2:
+        print(f"[{label}] {len(y_ho):,} new labelled rows ({int(y_ho.sum())} positive) since "
+              f"{ensemble['trained_through']:%Y-%m-%d} — keeping the saved ensemble.")
+        # Re-export too: tree_ensemble.load rejects a .npz older than its pickle
+        kept = {**ensemble, "updates": ensemble.get("updates", 0) + 1}
+        _save_ensemble(label, kept, X)
+        return kept
+    if cut < 100 or len(np.unique(y[:cut])) < 2:
+        print(f"[{label}] Full rebuild: only {cut:,} recent rows to continue on.")
+        return None
+
+    before = [ensemble[k].predict_proba(X_ho)[:, 1] for k in ("lgb", "xgb")]
+    after = [_continue(k, ensemble[k], X[:cut], y[:cut], threads).predict_proba(X_ho)[:, 1]
+             for k in ("lgb", "xgb")]
+    old_auc = roc_auc_score(y_ho, np.mean(before, axis=0))
+    new_auc = roc_auc_score(y_ho, np.mean(after, axis=0))
+    print(f"[{label}] Warm start on {len(y):,} recent rows | AUC on {len(y_ho):,} new rows "
+          f"{old_auc:.3f} → {new_auc:.3f}")
+    if new_auc < old_auc - WARM_START_AUC_DROP:
+        print(f"[{label}] Full rebuild: holdout AUC dropped.")
+        return None
+
+    # The new rows cover a few weeks of one market regime: weight them back
+    # to the window's positive rate so the meta-learner keeps its calibration
+    rate, rate_ho = y.mean(), y_ho.mean()
+    weight = np.where(y_ho == 1, rate / rate_ho, (1 - rate) / (1 - rate_ho))
+    meta = LogisticRegression(random_state=42, max_iter=500)
+    meta.fit(np.column_stack(after), y_ho, sample_weight=weight)
+    updated = {
+        "lgb": _continue("lgb", ensemble["lgb"], X, y, threads),
+        "xgb": _continue("xgb", ensemble["xgb"], X, y, threads),
+        "meta": meta,
+        "features": list(FEATURE_COLS),
+        "feature_version": FEATURE_VERSION,
+        "trained_through": pd.Timestamp(dates[-1]),
+        "updates": ensemble.get("updates", 0) + 1,
+    }
+    _save_ensemble(label, updated, X)
+    return updated
+
+
+def update_models(
+    features_by_ticker: dict[str, pd.DataFrame],
+    price_by_ticker: dict[str, pd.Series],
+    threads: int = TRAIN_THREADS,
+) -> dict:
+    """
+    Incremental retrain: each saved ensemble keeps boosting on the last
+    WARM_START_DAYS of rows (see _warm_start). A horizon is rebuilt from
+    scratch with train_models() instead when it has no saved model, was
+    trained on other FEATURE_COLS or FEATURE_VERSION, has had WARM_START_MAX_UPDATES warm starts
+    already, or its holdout AUC drops by more than WARM_START_AUC_DROP.
+    """
+    saved = load_models()
+    end = max(feat.index[-1] for feat in features_by_ticker.values() if len(feat))
+    since = end - pd.Timedelta(days=WARM_START_DAYS)
+    models, rebuild = {}, []
+    for label in HORIZONS:
+        ensemble = saved.get(label)
+        reason = None
+        if ensemble is None:
+            reason = "no saved model"
+        elif not _current(ensemble.get("features"), ensemble.get("feature_version")):
+            reason = "feature set changed"
+        elif "trained_through" not in ensemble:
+            reason = "saved without a trained_through date"
+        elif ensemble.get("updates", 0) >= WARM_START_MAX_UPDATES:
+            reason = f"{WARM_START_MAX_UPDATES} warm starts since the last full build"
+        if reason:
+            print(f"[{label}] Full rebuild: {reason}.")
+            rebuild.append(label)
+            continue
+        try:
+            updated = _warm_start(label, ensemble, features_by_ticker, price_by_ticker, since, threads)
+        except Exception as e:
+            print(f"[{label}] Full rebuild: warm start failed ({e}).")
+            updated = None
+        if updated is None:
+            rebuild.append(label)
+            continue
+        models[label] = updated
+
+    if rebuild:
+        models.update(train_models(features_by_ticker, price_by_ticker, labels=rebuild))
+    return {label: models[label] for label in HORIZONS if label in models}
+
+
+def load_models(compiled: bool = False) -> dict:
+    """
+    Saved ensemble per horizon. With `compiled`, a horizon is served by its
+    tree_ensemble export (NumPy only, no lightgbm/xgboost import) when that
+    is at least as new as the pickle and built on the current features.
+    """
     models = {}
     for label in HORIZONS:
         path = os.path.join(MODEL_DIR, f"model_{label}.pkl")
-        if os.path.exists(path):
+        if not os.path.exists(path):
+            continue
+        ensemble = tree_ensemble.load(label, path) if compiled else None
+        if ensemble is not None and _current(ensemble.features, ensemble.feature_version):
+            models[label] = ensemble
+        else:
             models[label] = joblib.load(path)
     return models
 
 
 def feature_count_matches() -> bool:
-    """Check if saved models were trained on the current feature set."""
+    """Check if saved models were trained on the current FEATURE_COLS and FEATURE_VERSION."""
     path = os.path.join(MODEL_DIR, "model_3M.pkl")
     if not os.path.exists(path):
         return False
+    compiled = tree_ensemble.load("3M", path)
+    if compiled is not None:
+        return _current(compiled.features, compiled.feature_version)
     try:
         ensemble = joblib.load(path)
-        return ensemble["lgb"].n_features_in_ == len(FEATURE_COLS)
+        return _current(ensemble.get("features"), ensemble.get("feature_version"))
     except Exception:
         return False
 
 
+def _float32(feat: pd.DataFrame, rows: slice = slice(None)) -> np.ndarray:
+    """FEATURE_COLS values of `rows` of a frame as float32, as the models were trained (see _pool_data)."""
+    # Selecting columns or rows through pandas costs more than scoring a row:
+    # skip the column lookup when the frame already has exactly FEATURE_COLS,
+    # as feature_engine builds them, and slice rows on the (usually viewed) array
+    if not feat.columns.equals(_FEATURE_INDEX):
+        feat = feat[FEATURE_COLS]
+    return np.asarray(feat.to_numpy()[rows], dtype=np.float32)
+
+
+def _latest_rows(features_by_ticker: dict[str, pd.DataFrame]) -> tuple[list[str], np.ndarray]:
+    """Each ticker's latest fully finite FEATURE_COLS row, stacked into one float32 matrix."""
+    tickers, rows = [], []
+    for ticker, feat in features_by_ticker.items():
+        latest = _float32(feat, slice(-1, None))
+        if not np.isfinite(latest).all():
+            values = _float32(feat)
+            latest = values[np.isfinite(values).all(axis=1)][-1:]
+        if len(latest):
+            tickers.append(ticker)
+            rows.append(latest)
+    if not rows:
+        return tickers, np.empty((0, len(FEATURE_COLS)), dtype=np.float32)
+    return tickers, np.concatenate(rows)
+
+
+def _ensemble_proba(ensemble, X: np.ndarray) -> np.ndarray:
+    """Stacked P(up) per row of X from a pickled or a compiled ensemble."""
+    if isinstance(ensemble, tree_ensemble.CompiledEnsemble):
+        return ensemble.predict_proba(X)
+    lgb_p = ensemble["lgb"].predict_proba(X)[:, 1]
+    xgb_p = ensemble["xgb"].predict_proba(X)[:, 1]
+    if "meta" in ensemble:
+        return ensemble["meta"].predict_proba(np.column_stack([lgb_p, xgb_p]))[:, 1]
+    return (lgb_p + xgb_p) / 2
+
+
 def predict(
     models: dict,
     features_by_ticker: dict[str, pd.DataFrame],
 ) -> pd.DataFrame:
-    rows = []
-    for ticker, feat in features_by_ticker.items():
-        latest = feat[FEATURE_COLS].replace([np.inf, -np.inf], np.nan).dropna().tail(1)
-        if latest.empty:
-            continue
-        row = {"ticker": ticker}
-        for label, ensemble in models.items():
-            try:
-                lgb_p = ensemble["lgb"].predict_proba(latest)[0][1]
-                xgb_p = ensemble["xgb"].predict_proba(latest)[0][1]
-                if "meta" in ensemble:
-                    import numpy as _np
-                    prob = ensemble["meta"].predict_proba(
-                        _np.column_stack([[lgb_p], [xgb_p]]))[0][1]
-                else:
-                    prob = (lgb_p + xgb_p) / 2
-                row[f"prob_{label}"] = round(prob * 100, 1)
-            except Exception:
-                row[f"prob_{label}"] = None
-        rows.append(row)
-
-    df = pd.DataFrame(rows)
+    """Score every ticker's latest row: each model runs once per horizon on the stacked matrix."""
+    tickers, X = _latest_rows(features_by_ticker)
+    columns = {"ticker": tickers}
+    for label, ensemble in models.items():
+        if not tickers:
+            break
+        try:
+            columns[f"prob_{label}"] = np.round(_ensemble_proba(ensemble, X) * 100, 1)
+        except Exception as e:
+            print(f"  [{label}] prediction failed: {e}")
+            columns[f"prob_{label}"] = [None] * len(tickers)
+
+    df = pd.DataFrame(columns)
     if df.empty:
         return df
 
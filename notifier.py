@@ -1,9 +1,9 @@
 from datetime import datetime
 
-import requests
 import pandas as pd
 
 from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TICKER_NAMES, TOP_N
+import provider
 
 _FLAG  = {"US Stock": "🇺🇸", "German Stock": "🇩🇪", "Crypto": "🪙"}
 _MEDAL = {1: "🥇", 2: "🥈", 3: "🥉"}
@@ -110,13 +110,13 @@ def _send(text: str):
         return
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     try:
-        r = requests.post(url, json={
+        status, body = provider.http_post(url, {
             "chat_id": TELEGRAM_CHAT_ID,
             "text": text,
             "parse_mode": "Markdown",
-        }, timeout=15)
-        if not r.ok:
-            print(f"Telegram error {r.status_code}: {r.text[:200]}")
+        })
+        if status >= 400:
+            print(f"Telegram error {status}: {body[:200]}")
     except Exception as e:
         print(f"Telegram error: {e}")
 
@@ -1,13 +1,15 @@
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import pandas as pd
-import yfinance as yf
 
+import price_store
 from config import DB_PATH
+from data_fetcher import download_group
 
 _HORIZONS = {"1M": 30, "3M": 91, "6M": 182}   # calendar days
 _THRESHOLDS = {"1M": 0.05, "3M": 0.10, "6M": 0.15}
+_FRESH_DAYS = 4      # stored bars this recent were updated by a daily run (weekends included)
 
 
 def _init(conn: sqlite3.Connection):
@@ -63,63 +65,93 @@ def save_prediction_prices(predictions: pd.DataFrame, current_prices: dict):
     conn.close()
 
 
+def _closes(targets: dict[str, pd.Timestamp]) -> pd.DataFrame:
+    """
+    Long (ticker, date, close) table from the price store for tickers with
+    outcomes due up to `targets[ticker]`. Tickers missing from the store, or
+    whose stored bars stop before their target and are no longer refreshed
+    daily (they left the universe), are brought up to date first.
+    """
+    frames = {t: price_store.load(t) for t in targets}
+    recent = pd.Timestamp.now().normalize() - pd.Timedelta(days=_FRESH_DAYS)
+    refresh = [t for t, df in frames.items()
+               if df is None or df.empty or df.index[-1] < min(targets[t], recent)]
+    if refresh:
+        frames.update(download_group("Outcome tracking", refresh, min_rows=1))
+    parts = [
+        pd.DataFrame({"ticker": t, "date": df.index, "close": df["Close"].to_numpy()})
+        for t, df in frames.items() if df is not None and not df.empty
+    ]
+    if not parts:
+        return pd.DataFrame(columns=["ticker", "date", "close"])
+    return pd.concat(parts, ignore_index=True).dropna(subset=["close"])
+
+
 def update_outcomes():
     """Fill in actual prices once each horizon has elapsed."""
     conn = sqlite3.connect(DB_PATH)
     _init(conn)
     pending = pd.read_sql("""
-        SELECT id, ticker, prediction_date, price_at_pred
+        SELECT id, ticker, prediction_date, price_at_pred, price_1M, price_3M, price_6M
         FROM outcome_tracking
         WHERE price_at_pred IS NOT NULL
           AND (hit_1M IS NULL OR hit_3M IS NULL OR hit_6M IS NULL)
     """, conn)
-    conn.close()
 
     if pending.empty:
+        conn.close()
+        return
+
+    # One row per (prediction, horizon) that has elapsed and is still unfilled
+    pending["prediction_date"] = pd.to_datetime(pending["prediction_date"])
+    now = pd.Timestamp.now()
+    due = []
+    for label, cal_days in _HORIZONS.items():
+        rows = pending[pending[f"price_{label}"].isna()]
+        rows = rows.assign(label=label, target=rows["prediction_date"] + pd.Timedelta(days=cal_days))
+        due.append(rows[rows["target"] <= now][["id", "ticker", "price_at_pred", "label", "target"]])
+    due = pd.concat(due, ignore_index=True)
+    if due.empty:
+        conn.close()
         return
 
-    today = datetime.now()
-    updates = []
-    for _, row in pending.iterrows():
-        pred_date = datetime.strptime(row["prediction_date"], "%Y-%m-%d")
-        for label, cal_days in _HORIZONS.items():
-            target = pred_date + timedelta(days=cal_days)
-            if today < target:
-                continue
-            col_price = f"price_{label}"
-            col_ret = f"return_{label}"
-            col_hit = f"hit_{label}"
-            # Check if already filled
-            conn2 = sqlite3.connect(DB_PATH)
-            val = conn2.execute(
-                f"SELECT {col_price} FROM outcome_tracking WHERE id = ?", (row["id"],)
-            ).fetchone()
-            conn2.close()
-            if val and val[0] is not None:
-                continue
-            try:
-                df = yf.download(
-                    row["ticker"],
-                    start=target.strftime("%Y-%m-%d"),
-                    end=(target + timedelta(days=7)).strftime("%Y-%m-%d"),
-                    interval="1d", progress=False, auto_adjust=True,
-                )
-                if isinstance(df.columns, pd.MultiIndex):
-                    df.columns = df.columns.get_level_values(0)
-                if df.empty:
-                    continue
-                actual = float(df["Close"].iloc[0])
-                ret = (actual / row["price_at_pred"] - 1) * 100
-                hit = 1 if ret >= _THRESHOLDS[label] * 100 else 0
-                conn3 = sqlite3.connect(DB_PATH)
-                conn3.execute(
-                    f"UPDATE outcome_tracking SET {col_price}=?, {col_ret}=?, {col_hit}=? WHERE id=?",
-                    (actual, round(ret, 2), hit, row["id"]),
-                )
-                conn3.commit()
-                conn3.close()
-            except Exception as e:
-                print(f"  Outcome update failed {row['ticker']} {label}: {e}")
+    # As-of join: first close on or within 6 days after each target date
+    closes = _closes(due.groupby("ticker")["target"].max().to_dict())
+    closes["date"] = pd.to_datetime(closes["date"]).astype("datetime64[ns]")
+    due["target"] = due["target"].astype("datetime64[ns]")
+    resolved = pd.merge_asof(
+        due.sort_values("target"), closes.sort_values("date"),
+        left_on="target", right_on="date", by="ticker",
+        direction="forward", tolerance=pd.Timedelta(days=6),
+    ).dropna(subset=["close"])
+    if resolved.empty:
+        conn.close()
+        return
+
+    resolved["ret"] = (resolved["close"] / resolved["price_at_pred"] - 1) * 100
+    resolved["hit"] = (resolved["ret"] >= resolved["label"].map(_THRESHOLDS) * 100).astype(int)
+    resolved["ret"] = resolved["ret"].round(2)
+
+    wide = resolved.pivot(index="id", columns="label", values=["close", "ret", "hit"])
+    params = []
+    for row_id, row in wide.iterrows():
+        values = []
+        for label in _HORIZONS:
+            for field in ("close", "ret", "hit"):
+                v = row.get((field, label))
+                values.append(None if pd.isna(v) else (int(v) if field == "hit" else float(v)))
+        params.append((*values, int(row_id)))
+
+    conn.executemany("""
+        UPDATE outcome_tracking SET
+            price_1M = COALESCE(?, price_1M), return_1M = COALESCE(?, return_1M), hit_1M = COALESCE(?, hit_1M),
+            price_3M = COALESCE(?, price_3M), return_3M = COALESCE(?, return_3M), hit_3M = COALESCE(?, hit_3M),
+            price_6M = COALESCE(?, price_6M), return_6M = COALESCE(?, return_6M), hit_6M = COALESCE(?, hit_6M)
+        WHERE id = ?
+    """, params)
+    conn.commit()
+    conn.close()
+    print(f"  Outcomes: resolved {len(resolved)} horizon(s) for {len(params)} prediction(s).")
 
 
 def get_accuracy() -> dict:
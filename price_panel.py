@@ -0,0 +1,127 @@
+"""
+Memory-mapped float32 price panel.
+
+All OHLCV data for a run lives in one (ticker × date × field) float32 array
+backed by a file under CACHE_DIR, with a shared date index (the union of
+every ticker's trading days) and a ticker index. A ticker has no bar on a
+date when its Close is NaN there.
+
+PricePanel is a read-only Mapping of ticker → OHLCV DataFrame, so code that
+used the old dict[str, DataFrame] keeps working. Those frames hold only the
+ticker's own bars, so they are a copy (a gather over its dates) for any
+ticker with gaps on the union calendar: every stock and ETF once crypto's
+weekend bars are in it. Vectorized code should use field() / close_matrix(),
+which are (ticker × date) views of the mapped array without copying.
+Pickling a panel only sends its file path, so worker processes map the same
+pages instead of receiving a copy of the data.
+"""
+import os
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import CACHE_DIR
+
+FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+_CLOSE = FIELDS.index("Close")
+_DEFAULT_PATH = Path(CACHE_DIR) / "panel.f32"
+
+
+def _meta_path(path: Path) -> Path:
+    return path.with_suffix(".meta.npz")
+
+
+class PricePanel(Mapping):
+    def __init__(self, path: Path, tickers: list[str], dates: pd.DatetimeIndex, mode: str = "r"):
+        self.path = Path(path)
+        self.tickers = list(tickers)
+        self.dates = dates
+        self._pos = {t: i for i, t in enumerate(self.tickers)}
+        self.values = np.memmap(self.path, dtype=np.float32, mode=mode,
+                                shape=(len(self.tickers), len(dates), len(FIELDS)))
+        self._valid = ~np.isnan(self.values[:, :, _CLOSE])
+
+    # ── construction ────────────────────────────────────────────────────────
+    @classmethod
+    def from_frames(cls, frames: dict[str, pd.DataFrame], path: Path = _DEFAULT_PATH) -> "PricePanel":
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tickers = list(frames)
+        dates = pd.DatetimeIndex(sorted(set().union(*[df.index for df in frames.values()])))
+
+        # Build under a temp name so panels still mapped from an earlier run
+        # keep their own (old) file
+        tmp = path.with_suffix(".tmp")
+        values = np.memmap(tmp, dtype=np.float32, mode="w+",
+                           shape=(len(tickers), len(dates), len(FIELDS)))
+        values[:] = np.nan
+        for i, ticker in enumerate(tickers):
+            df = frames[ticker]
+            pos = dates.get_indexer(df.index)
+            for j, field in enumerate(FIELDS):
+                if field in df:
+                    values[i, pos, j] = df[field].to_numpy(dtype=np.float32)
+        values.flush()
+        del values
+        os.replace(tmp, path)
+
+        np.savez(_meta_path(path), tickers=np.array(tickers, dtype=object),
+                 dates=np.asarray(dates, dtype="datetime64[ns]"))
+        return cls(path, tickers, dates)
+
+    @classmethod
+    def open(cls, path: Path = _DEFAULT_PATH) -> "PricePanel":
+        with np.load(_meta_path(Path(path)), allow_pickle=True) as meta:
+            tickers = meta["tickers"].tolist()
+            dates = pd.DatetimeIndex(meta["dates"])
+        return cls(path, tickers, dates)
+
+    def __reduce__(self):
+        return PricePanel.open, (self.path,)
+
+    # ── Mapping interface (ticker → OHLCV DataFrame) ────────────────────────
+    def __getitem__(self, ticker: str) -> pd.DataFrame:
+        i = self._pos[ticker]
+        rows = self.rows(ticker)
+        return pd.DataFrame(self.values[i, rows], index=self.dates[rows],
+                            columns=FIELDS, copy=False)
+
+    def __iter__(self):
+        return iter(self.tickers)
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    def __contains__(self, ticker) -> bool:
+        return ticker in self._pos
+
+    # ── array access ────────────────────────────────────────────────────────
+    def position(self, ticker: str) -> int:
+        """Index of the ticker along the first axis of `values`."""
+        return self._pos[ticker]
+
+    def rows(self, ticker: str) -> slice | np.ndarray:
+        """
+        Date positions where the ticker has a bar: a slice when they are
+        contiguous (indexing then gives a view), else an index array (a copy).
+        """
+        idx = np.flatnonzero(self._valid[self._pos[ticker]])
+        if len(idx) == 0:
+            return slice(0, 0)
+        if idx[-1] - idx[0] + 1 == len(idx):
+            return slice(int(idx[0]), int(idx[-1]) + 1)
+        return idx
+
+    def field(self, name: str) -> np.ndarray:
+        """(ticker × date) view of one field."""
+        return self.values[:, :, FIELDS.index(name)]
+
+    def close_matrix(self) -> np.ndarray:
+        return self.values[:, :, _CLOSE]
+
+    def close(self, ticker: str) -> pd.Series:
+        i = self._pos[ticker]
+        rows = self.rows(ticker)
+        return pd.Series(self.values[i, rows, _CLOSE], index=self.dates[rows], name="Close")
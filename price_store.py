@@ -0,0 +1,121 @@
+"""
+Persistent per-ticker OHLCV store.
+
+Every ticker gets its own directory under STORE_DIR holding append-only,
+compressed column partitions (one .npz per write: a date column plus one
+array per price field). Later partitions win on overlapping dates, so the
+last bar can be revised simply by appending it again. Once a ticker has
+accumulated too many partitions they are compacted into one.
+
+A ticker's generation counts how often its history was replaced (a full
+re-download, e.g. after Yahoo re-adjusted it). Within one generation the
+history only grows at its end, so anything derived from a prefix of it
+stays valid (see feature_store).
+
+Daily bars live in <ticker>/, bars of any other interval in
+<ticker>@<interval>/ (e.g. BTC-USD@1h/).
+"""
+import os
+import re
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import STORE_DIR
+
+FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+_MAX_PARTITIONS = 32
+
+Path(STORE_DIR).mkdir(parents=True, exist_ok=True)
+
+
+def _ticker_dir(ticker: str, interval: str = "1d") -> Path:
+    # ^GSPC, DX-Y.NYB, ... → filesystem-safe directory names
+    name = re.sub(r"[^A-Za-z0-9.\-]", "_", ticker)
+    return Path(STORE_DIR) / (name if interval == "1d" else f"{name}@{interval}")
+
+
+def _partitions(ticker: str, interval: str = "1d") -> list[Path]:
+    return sorted(_ticker_dir(ticker, interval).glob("part_*.npz"))
+
+
+def _write_partition(path: Path, df: pd.DataFrame):
+    """Write one partition atomically (temp file + rename)."""
+    index = df.index
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    arrays = {"Date": np.asarray(index, dtype="datetime64[ns]").view("int64")}
+    for field in FIELDS:
+        if field in df:
+            arrays[field] = df[field].to_numpy(dtype="float64")
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            np.savez_compressed(fh, **arrays)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _read_partition(path: Path) -> pd.DataFrame:
+    with np.load(path) as npz:
+        index = pd.DatetimeIndex(npz["Date"].view("datetime64[ns]"), name="Date")
+        return pd.DataFrame({f: npz[f] for f in FIELDS if f in npz.files}, index=index)
+
+
+def load(ticker: str, interval: str = "1d") -> pd.DataFrame | None:
+    """Return the full stored history for a ticker, or None if nothing is stored."""
+    parts = _partitions(ticker, interval)
+    if not parts:
+        return None
+    df = pd.concat([_read_partition(p) for p in parts])
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+    return df
+
+
+def append(ticker: str, df: pd.DataFrame, interval: str = "1d"):
+    """Append bars as a new partition; compacts once the partition count grows."""
+    if df.empty:
+        return
+    parts = _partitions(ticker, interval)
+    if not parts:
+        replace(ticker, df, interval)
+        return
+    seq = int(parts[-1].stem.split("_")[1]) + 1
+    _write_partition(_ticker_dir(ticker, interval) / f"part_{seq:06d}.npz", df)
+    if len(parts) + 1 > _MAX_PARTITIONS:
+        compact(ticker, interval)
+
+
+def generation(ticker: str, interval: str = "1d") -> int:
+    """Number of times the ticker's history was replaced (0 before the first)."""
+    try:
+        return int((_ticker_dir(ticker, interval) / "generation").read_text())
+    except (OSError, ValueError):
+        return 0
+
+
+def replace(ticker: str, df: pd.DataFrame, interval: str = "1d"):
+    """Drop everything stored for a ticker and write df as its only partition, in a new generation."""
+    _rewrite(ticker, df, interval)
+    path = _ticker_dir(ticker, interval) / "generation"
+    path.write_text(str(generation(ticker, interval) + 1))
+
+
+def _rewrite(ticker: str, df: pd.DataFrame, interval: str = "1d"):
+    folder = _ticker_dir(ticker, interval)
+    folder.mkdir(parents=True, exist_ok=True)
+    old = _partitions(ticker, interval)
+    seq = int(old[-1].stem.split("_")[1]) + 1 if old else 0
+    _write_partition(folder / f"part_{seq:06d}.npz", df)
+    for p in old:
+        p.unlink(missing_ok=True)
+
+
+def compact(ticker: str, interval: str = "1d"):
+    df = load(ticker, interval)
+    if df is not None:
+        _rewrite(ticker, df, interval)
@@ -0,0 +1,128 @@
+"""
+Record/replay layer under every network call of the pipeline.
+
+PROVIDER_MODE (env) selects one of three modes:
+
+  live    – calls go straight to yfinance / Yahoo RSS / Telegram (default).
+  record  – calls go out as in live mode and every response (or exception)
+            is archived as a gzip pickle under FIXTURE_DIR/<kind>/.
+  replay  – responses are served from the archive; nothing touches the
+            network. REPLAY_LATENCY scales the recorded call durations
+            (0 = instant, 1 = as recorded).
+
+In record and replay modes the store, cache, database, models and
+picks.json live in a scratch directory that begin_run() wipes, so every
+run starts cold and asks for exactly the same calls. Outbound messages
+(Telegram, push notifications) are archived, never sent. The clock is not
+frozen: replay on a later day trims history windows slightly differently.
+"""
+import gzip
+import hashlib
+import json
+import pickle
+import shutil
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable
+
+from config import (
+    PROVIDER_MODE, FIXTURE_DIR, REPLAY_LATENCY, RUN_DIR,
+    MODEL_DIR, CACHE_DIR, STORE_DIR, FEATURE_STORE_DIR,
+)
+
+stats: Counter = Counter()
+_lock = threading.Lock()
+
+
+class MissingFixture(Exception):
+    """Replay mode asked for a call that was never recorded."""
+
+
+def _path(kind: str, key: Any) -> Path:
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+    return Path(FIXTURE_DIR) / kind / f"{digest}.pkl.gz"
+
+
+def _count(name: str):
+    with _lock:
+        stats[name] += 1
+
+
+def call(kind: str, key: Any, fn: Callable[[], Any]) -> Any:
+    """Run fn() according to PROVIDER_MODE; `key` must identify the request uniquely."""
+    if PROVIDER_MODE == "live":
+        return fn()
+
+    path = _path(kind, key)
+    if PROVIDER_MODE == "replay":
+        try:
+            with gzip.open(path, "rb") as fh:
+                elapsed, ok, value = pickle.load(fh)
+        except FileNotFoundError:
+            _count("missing")
+            raise MissingFixture(f"{kind} {key!r}")
+        _count("replayed")
+        if REPLAY_LATENCY:
+            time.sleep(elapsed * REPLAY_LATENCY)
+        if not ok:
+            raise value
+        return value
+
+    t0 = time.monotonic()
+    try:
+        value, ok = fn(), True
+    except Exception as e:
+        value, ok = e, False
+    elapsed = time.monotonic() - t0
+    try:
+        blob = pickle.dumps((elapsed, ok, value))
+    except Exception as e:
+        blob = pickle.dumps((elapsed, False, RuntimeError(f"unpicklable {kind} response: {e}")))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wb") as fh:
+        fh.write(blob)
+    tmp.replace(path)
+    _count("recorded")
+    if not ok:
+        raise value
+    return value
+
+
+def http_get(url: str, headers: dict | None = None, timeout: float = 15) -> tuple[int, dict, bytes]:
+    """GET through the pooled session. Returns (status, headers, body)."""
+    def fetch():
+        from ticker_registry import http_session
+        r = http_session().get(url, headers=headers or {}, timeout=timeout)
+        return r.status_code, dict(r.headers), r.content
+    return call("http_get", url, fetch)
+
+
+def http_post(url: str, payload: dict, headers: dict | None = None, timeout: float = 15) -> tuple[int, str]:
+    """POST JSON through the pooled session. Returns (status, body text)."""
+    if PROVIDER_MODE != "live":
+        # Never deliver messages from a recording or a replay; keep the payload instead
+        out = Path(RUN_DIR) / "outbox.jsonl"
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with _lock, open(out, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps({"url": url.split("/bot")[0], "payload": payload}, ensure_ascii=False) + "\n")
+        return 200, "{}"
+    from ticker_registry import http_session
+    r = http_session().post(url, json=payload, headers=headers or {}, timeout=timeout)
+    return r.status_code, r.text
+
+
+def begin_run():
+    """Start every record/replay run from an empty scratch directory."""
+    stats.clear()
+    if PROVIDER_MODE != "live":
+        shutil.rmtree(RUN_DIR, ignore_errors=True)
+        for folder in (MODEL_DIR, CACHE_DIR, STORE_DIR, FEATURE_STORE_DIR):
+            Path(folder).mkdir(parents=True, exist_ok=True)
+
+
+def report():
+    if PROVIDER_MODE != "live":
+        print(f"  Provider ({PROVIDER_MODE}): " + ", ".join(f"{k} {v}" for k, v in sorted(stats.items())))
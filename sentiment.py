@@ -1,40 +1,153 @@
-import time
-from datetime import datetime, timedelta
+import re
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 
 import feedparser
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
+import cache
+from config import TICKER_NAMES, SENTIMENT_BATCH_SIZE
+from executor import run_per_ticker, YAHOO_RSS, Throttled
+import provider
+
+_FEED_URL = "https://feeds.finance.yahoo.com/rss/2.0/headline?s={symbols}&region=US&lang=en-US"
+_KEEP_DAYS = 30          # headlines older than this are dropped from the cache
+
 _analyzer = SentimentIntensityAnalyzer()
 
+# {"feeds": {url: {"etag", "modified", "guids"}},
+#  "headlines": {guid: {"pub", "title", "score", "symbols"}}}
+_state: dict | None = None
+_lock = threading.Lock()
+
 
 def _score(text: str) -> float:
     """VADER compound score: -1 (very negative) to +1 (very positive)."""
     return _analyzer.polarity_scores(text)["compound"]
 
 
-def get_sentiment(ticker: str, days_back: int = 7) -> dict:
-    query = ticker.replace(".DE", "").replace(".F", "")
-    url = f"https://feeds.finance.yahoo.com/rss/2.0/headline?s={query}&region=US&lang=en-US"
-    cutoff = datetime.now() - timedelta(days=days_back)
+def _query(ticker: str) -> str:
+    return ticker.replace(".DE", "").replace(".F", "")
+
+
+def _load_state() -> dict:
+    global _state
+    if _state is None:
+        _state = cache.get("sentiment", "state") or {"feeds": {}, "headlines": {}}
+    return _state
+
+
+def _save_state():
+    with _lock:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=_KEEP_DAYS)
+        state = _load_state()
+        state["headlines"] = {g: h for g, h in state["headlines"].items() if h["pub"] >= cutoff}
+        cache.put("sentiment", "state", state)
 
-    total, count = 0.0, 0
+
+def _matchers(tickers: list[str]) -> dict[str, re.Pattern]:
+    """
+    Batched feeds mix headlines for several symbols, so each headline is
+    assigned to the tickers whose symbol or company name it mentions.
+    Symbols shorter than 3 letters ("A", "V", "MA") only count as "(V)" or "$V".
+    """
+    out = {}
+    for t in tickers:
+        sym = re.escape(_query(t))
+        name = re.escape(TICKER_NAMES.get(t, _query(t)))
+        sym_pat = rf"\b{sym}\b" if len(_query(t)) >= 3 else rf"[($]{sym}\b"
+        out[t] = re.compile(rf"{sym_pat}|(?i:\b{name}\b)")
+    return out
+
+
+def _item(guid: str | None, link: str | None, title: str | None,
+          description: str | None, pub: str | None) -> dict:
+    title = title or ""
+    return {"guid": guid or link or title, "title": title,
+            "text": title + " " + (description or ""), "pub": pub}
+
+
+def _parse_items(content: bytes) -> list[dict]:
+    """
+    RSS <item>s as guid, title, text and date. A feed that is not well-formed
+    XML (HTML entities such as &nbsp; in a title) is parsed by feedparser,
+    which tolerates it, instead of losing the batch's headlines.
+    """
     try:
-        feed = feedparser.parse(url)
-        for entry in feed.get("entries", []):
+        root = ET.fromstring(content)
+    except ET.ParseError:
+        return [_item(e.get("id"), e.get("link"), e.get("title"), e.get("summary"), e.get("published"))
+                for e in feedparser.parse(content).get("entries", [])]
+    return [_item(e.findtext("guid"), e.findtext("link"), e.findtext("title"),
+                  e.findtext("description"), e.findtext("pubDate"))
+            for e in root.iter("item")]
+
+
+def _fetch_feed(tickers: list[str]) -> list[str]:
+    """
+    Conditionally fetch one feed covering `tickers`; new headlines are scored
+    and added to the cache. Returns the GUIDs currently in the feed.
+    """
+    url = _FEED_URL.format(symbols=",".join(_query(t) for t in tickers))
+    fresh = cache.get("feeds", url)
+    if fresh is not None:
+        return fresh
+    with _lock:
+        meta = dict(_load_state()["feeds"].get(url, {}))
+
+    headers = {"User-Agent": "Mozilla/5.0"}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("modified"):
+        headers["If-Modified-Since"] = meta["modified"]
+
+    status, resp_headers, content = provider.http_get(url, headers=headers)
+    if status == 304:
+        cache.put("feeds", url, meta.get("guids", []))
+        return meta.get("guids", [])
+    if status == 429:
+        raise Throttled(f"429 from {YAHOO_RSS}")
+    if status != 200:
+        return []
+    items = _parse_items(content)
+    resp_headers = {k.lower(): v for k, v in resp_headers.items()}
+    etag, modified = resp_headers.get("etag"), resp_headers.get("last-modified")
+
+    match = _matchers(tickers) if len(tickers) > 1 else None
+    with _lock:
+        state = _load_state()
+        for item in items:
+            symbols = tickers if match is None else [t for t, p in match.items() if p.search(item["text"])]
+            cached = state["headlines"].get(item["guid"])
+            if cached is not None:
+                cached["symbols"] = sorted(set(cached["symbols"]) | set(symbols))
+                continue
             try:
-                pub = datetime(*entry.published_parsed[:6])
-                if pub >= cutoff:
-                    total += _score(entry.get("title", ""))
-                    count += 1
+                pub = parsedate_to_datetime(item["pub"]).astimezone(timezone.utc)
             except Exception:
                 continue
-    except Exception:
-        pass
+            state["headlines"][item["guid"]] = {
+                "pub": pub, "title": item["title"],
+                "score": _score(item["title"]), "symbols": list(symbols),
+            }
+        guids = [i["guid"] for i in items]
+        state["feeds"][url] = {"etag": etag, "modified": modified, "guids": guids}
+    cache.put("feeds", url, guids)
+    return guids
+
 
-    if count == 0:
+def _summarize(ticker: str, days_back: int) -> dict:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days_back)
+    with _lock:
+        scores = [h["score"] for h in _load_state()["headlines"].values()
+                  if ticker in h["symbols"] and h["pub"] >= cutoff]
+
+    if not scores:
         return {"sentiment_boost": 0.0, "sentiment_label": "Neutral 😐", "articles": 0}
 
-    avg = total / count
+    avg = sum(scores) / len(scores)
 
     if avg >= 0.35:
         label, boost = "Positive 🟢", 8.0
@@ -47,14 +160,26 @@ def get_sentiment(ticker: str, days_back: int = 7) -> dict:
     else:
         label, boost = "Neutral 😐", 0.0
 
-    return {"sentiment_boost": boost, "sentiment_label": label, "articles": count}
+    return {"sentiment_boost": boost, "sentiment_label": label, "articles": len(scores)}
+
+
+def get_sentiment(ticker: str, days_back: int = 7) -> dict:
+    try:
+        _fetch_feed([ticker])
+        _save_state()
+    except Throttled:
+        raise
+    except Exception:
+        pass
+    return _summarize(ticker, days_back)
 
 
-def get_all_sentiments(tickers: list[str]) -> dict[str, dict]:
-    result = {}
-    for i, ticker in enumerate(tickers, 1):
-        print(f"  Sentiment {ticker} ({i}/{len(tickers)})", end="\r")
-        result[ticker] = get_sentiment(ticker)
-        time.sleep(0.1)
-    print()
-    return result
+def get_all_sentiments(tickers: list[str], days_back: int = 7) -> dict[str, dict]:
+    batches = {
+        ",".join(tickers[i:i + SENTIMENT_BATCH_SIZE]): tickers[i:i + SENTIMENT_BATCH_SIZE]
+        for i in range(0, len(tickers), SENTIMENT_BATCH_SIZE)
+    }
+    run_per_ticker(lambda key: _fetch_feed(batches[key]), list(batches),
+                   "Sentiment feeds", host=YAHOO_RSS, default=[])
+    _save_state()
+    return {t: _summarize(t, days_back) for t in tickers}
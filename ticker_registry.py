@@ -0,0 +1,98 @@
+"""
+Run-scoped registry of yfinance Tickers.
+
+Every module asks get_ticker() for a symbol instead of building its own
+yf.Ticker, so each symbol is constructed once per run and each attribute
+(.info, .calendar, .options, ...) is fetched at most once. All Tickers, and
+anything else that talks HTTP (RSS feeds, Telegram), share one pooled
+session. main.run() calls reset() at the start of every run.
+"""
+import threading
+from collections import namedtuple
+
+import yfinance as yf
+
+import provider
+from config import FETCH_WORKERS
+
+# yfinance builds its own namedtuple class per call, which cannot be pickled
+OptionChain = namedtuple("OptionChain", ["calls", "puts", "underlying"])
+
+_session = None
+_tickers: dict[str, "SharedTicker"] = {}
+_lock = threading.Lock()
+_session_lock = threading.Lock()
+
+
+def http_session():
+    """One pooled session for the whole process (curl_cffi if available, as yfinance prefers)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            try:
+                from curl_cffi import requests as curl_requests
+                _session = curl_requests.Session(impersonate="chrome")
+            except ImportError:
+                import requests
+                from requests.adapters import HTTPAdapter
+                _session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=FETCH_WORKERS)
+                _session.mount("https://", adapter)
+                _session.mount("http://", adapter)
+        return _session
+
+
+class SharedTicker:
+    """yf.Ticker wrapper that memoizes every attribute for the rest of the run."""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self._ticker = yf.Ticker(symbol, session=http_session())
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key, loader):
+        # Failures are not memoized, so a throttled call can be retried
+        with self._lock:
+            if key not in self._memo:
+                self._memo[key] = provider.call("ticker", (self.symbol, key), loader)
+            return self._memo[key]
+
+    @property
+    def info(self) -> dict:
+        return self._get("info", lambda: self._ticker.info)
+
+    @property
+    def calendar(self):
+        return self._get("calendar", lambda: self._ticker.calendar)
+
+    @property
+    def options(self) -> tuple:
+        return self._get("options", lambda: self._ticker.options)
+
+    @property
+    def insider_transactions(self):
+        return self._get("insider_transactions", lambda: self._ticker.insider_transactions)
+
+    @property
+    def recommendations(self):
+        return self._get("recommendations", lambda: self._ticker.recommendations)
+
+    def get_recommendations_summary(self):
+        return self._get("recommendations_summary", self._ticker.get_recommendations_summary)
+
+    def option_chain(self, expiry: str):
+        return self._get(("option_chain", expiry), lambda: OptionChain(*self._ticker.option_chain(expiry)))
+
+
+def get_ticker(symbol: str) -> SharedTicker:
+    with _lock:
+        if symbol not in _tickers:
+            _tickers[symbol] = SharedTicker(symbol)
+        return _tickers[symbol]
+
+
+def reset():
+    """Forget all memoized Tickers (the pooled session is kept)."""
+    with _lock:
+        _tickers.clear()
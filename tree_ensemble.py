@@ -0,0 +1,312 @@
+"""
+Compiled tree-ensemble inference without lightgbm or xgboost.
+
+export() flattens a stacked ensemble from ml_engine into one .npz per
+horizon: for LightGBM (dump_model()) and XGBoost (the JSON model) every
+tree's nodes are concatenated into split feature / threshold / child /
+missing-value arrays (with a node's children side by side), next to the
+logistic meta weights. Scoring walks every (row, tree) pair down one level per
+vectorized step, dropping pairs as they reach a leaf, so a batch costs a
+few gathers per tree level and needs NumPy only.
+
+The node rules follow the libraries: LightGBM sends x <= threshold left,
+maps NaN to 0 unless the split learned a NaN direction and treats |x| <=
+1e-35 as missing for "Zero" splits; XGBoost sends x < threshold left and
+NaN to the learned default. Leaves are summed in tree order in each
+library's precision (float64 / float32). export() checks the compiled
+probabilities against the original estimators on sample rows and keeps
+no file when they differ, so callers fall back to the pickled models.
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from config import MODEL_DIR
+
+_NONE, _ZERO, _NAN = 0, 1, 2
+_MISSING = {"None": _NONE, "Zero": _ZERO, "NaN": _NAN}
+_ZERO_THRESHOLD = 1e-35
+_TOLERANCE = 1e-6
+_CHUNK_ROWS = 256       # rows walked together: keeps the (row, tree) arrays in cache
+_FIELDS = ("roots", "feature", "threshold", "child", "default_left", "missing", "value")
+
+
+def _path(label: str) -> Path:
+    return Path(MODEL_DIR) / f"model_{label}.npz"
+
+
+class TreeEnsemble:
+    """
+    Flattened boosted trees: P(up) = sigmoid(scale × (base + Σ leaf values)).
+    An internal node's children are adjacent (right = child + 1); a leaf has
+    feature -1 and is its own child.
+    """
+
+    def __init__(self, roots, feature, threshold, child, default_left, missing, value,
+                 base: float, scale: float, strict: bool, dtype: str):
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.child = np.asarray(child, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.missing = np.asarray(missing, dtype=np.int8)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.base = float(base)
+        self.scale = float(scale)
+        self.strict = bool(strict)          # XGBoost: x < threshold goes left
+        self.dtype = np.dtype(dtype)
+        # Gather tables of the walk. A leaf splits on feature 0 at +inf and
+        # sends NaN left, i.e. back to itself, so pairs that reached one can
+        # be dropped in batches. A NaN takes the learned default or, for
+        # LightGBM splits that never saw a missing value, the side of 0
+        leaf = self.feature < 0
+        zero_left = 0 < self.threshold if self.strict else 0 <= self.threshold
+        nan_left = np.where(self.missing == _NONE, zero_left, self.default_left)
+        self._leaf = leaf
+        self._split = np.where(leaf, 0, self.feature).astype(np.intp)
+        self._threshold = np.where(leaf, np.inf, self.threshold)
+        self._nan_right = ~(leaf | nan_left)
+        self._zero = np.flatnonzero(self.missing == _ZERO)
+        self._child = self.child.astype(np.intp)
+
+    def _leaves(self, X: np.ndarray) -> np.ndarray:
+        """Leaf reached in every tree by every row, as a (rows × trees) node matrix."""
+        n, width = X.shape
+        flat = X.ravel()
+        node = np.tile(self.roots.astype(np.intp), n)         # row-major (row, tree) pairs
+        offset = np.repeat(np.arange(0, n * width, width, dtype=np.intp), len(self.roots))
+        leaves = np.empty_like(node)
+        pending = np.arange(len(node))
+        # One tree level per pass; pairs at a leaf are dropped once they are
+        # a quarter of those left, as compacting costs more than a level
+        while len(pending):
+            done = self._leaf.take(node)
+            finished = np.count_nonzero(done)
+            if finished and 4 * finished >= len(done):
+                leaves[pending[done]] = node[done]
+                keep = np.flatnonzero(~done)
+                pending, node, offset = pending.take(keep), node.take(keep), offset.take(keep)
+                if not len(pending):
+                    break
+            index = self._split.take(node)
+            index += offset
+            x = flat.take(index)
+            threshold = self._threshold.take(node)
+            right = x >= threshold if self.strict else x > threshold
+            nan = np.isnan(x)
+            if len(self._zero):
+                nan |= np.isin(node, self._zero) & (np.abs(x) <= _ZERO_THRESHOLD)
+            if nan.any():
+                right[nan] = self._nan_right[node[nan]]
+            node = self._child.take(node)
+            node += right
+        return leaves.reshape(n, len(self.roots))
+
+    def raw(self, X: np.ndarray) -> np.ndarray:
+        """Margin (log-odds before `scale`) of every row of X."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        terms = np.empty((len(X), len(self.roots) + 1), dtype=self.dtype)
+        terms[:, 0] = self.base
+        for start in range(0, len(X), _CHUNK_ROWS):
+            rows = slice(start, start + _CHUNK_ROWS)
+            terms[rows, 1:] = self.value.take(self._leaves(X[rows]))
+        # Summed in tree order, in the library's precision
+        return np.cumsum(terms, axis=1, dtype=self.dtype)[:, -1]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """P(up) of every row of X (the second predict_proba column of the estimator)."""
+        margin = self.raw(X)
+        one = self.dtype.type(1)
+        return (one / (one + np.exp(-self.dtype.type(self.scale) * margin))).astype(np.float64)
+
+    def arrays(self, prefix: str) -> dict:
+        out = {f"{prefix}_{name}": getattr(self, name) for name in _FIELDS}
+        out[f"{prefix}_params"] = np.array([self.base, self.scale, self.strict], dtype=np.float64)
+        out[f"{prefix}_dtype"] = np.array(self.dtype.name)
+        return out
+
+    @classmethod
+    def from_arrays(cls, npz, prefix: str) -> "TreeEnsemble":
+        base, scale, strict = npz[f"{prefix}_params"]
+        return cls(*(npz[f"{prefix}_{name}"] for name in _FIELDS),
+                   base=base, scale=scale, strict=bool(strict), dtype=str(npz[f"{prefix}_dtype"]))
+
+
+class _Builder:
+    """Collects nodes tree by tree; build() lays them out with adjacent children."""
+
+    def __init__(self):
+        self.nodes: list[tuple] = []        # (feature, threshold, default_left, missing, value)
+        self.left: list[int] = []
+        self.right: list[int] = []
+        self.roots: list[int] = []
+
+    def node(self, feature=-1, threshold=0.0, default_left=False, missing=_NONE, value=0.0) -> int:
+        self.nodes.append((feature, threshold, default_left, missing, value))
+        self.left.append(-1)
+        self.right.append(-1)
+        return len(self.nodes) - 1
+
+    def link(self, parent: int, left: int, right: int):
+        self.left[parent] = left
+        self.right[parent] = right
+
+    def build(self, **params) -> TreeEnsemble:
+        order, child = [], []
+        roots = []
+        for root in self.roots:
+            roots.append(len(order))
+            order.append(root)
+            child.append(-1)
+            i = len(order) - 1
+            while i < len(order):               # breadth-first: siblings land side by side
+                old = order[i]
+                if self.left[old] >= 0:
+                    child[i] = len(order)
+                    order += [self.left[old], self.right[old]]
+                    child += [-1, -1]
+                else:
+                    child[i] = i
+                i += 1
+        feature, threshold, default_left, missing, value = zip(*(self.nodes[old] for old in order))
+        return TreeEnsemble(roots, feature, threshold, child, default_left, missing, value, **params)
+
+
+def compile_lgb(model) -> TreeEnsemble:
+    """TreeEnsemble of a fitted binary LGBMClassifier (numerical splits only)."""
+    dump = model.booster_.dump_model()
+    objective = dump["objective"].split()
+    if objective[0] != "binary":
+        raise ValueError(f"unsupported LightGBM objective {dump['objective']!r}")
+    scale = float(next((p.split(":")[1] for p in objective[1:] if p.startswith("sigmoid:")), 1.0))
+    b = _Builder()
+
+    def add(tree: dict) -> int:
+        if "leaf_value" in tree:
+            return b.node(value=tree["leaf_value"])
+        if tree["decision_type"] != "<=":
+            raise ValueError(f"unsupported LightGBM split {tree['decision_type']!r}")
+        i = b.node(tree["split_feature"], tree["threshold"], tree["default_left"],
+                   _MISSING[tree["missing_type"]])
+        b.link(i, add(tree["left_child"]), add(tree["right_child"]))
+        return i
+
+    for info in dump["tree_info"]:
+        b.roots.append(add(info["tree_structure"]))
+    return b.build(base=0.0, scale=scale, strict=False, dtype="float64")
+
+
+def compile_xgb(model) -> TreeEnsemble:
+    """TreeEnsemble of a fitted binary:logistic XGBClassifier (numerical splits only)."""
+    learner = json.loads(model.get_booster().save_raw(raw_format="json"))["learner"]
+    if learner["objective"]["name"] != "binary:logistic":
+        raise ValueError(f"unsupported XGBoost objective {learner['objective']['name']!r}")
+    booster = learner["gradient_booster"]
+    if booster["name"] != "gbtree":
+        raise ValueError(f"unsupported XGBoost booster {booster['name']!r}")
+    base_score = np.float32(float(learner["learner_model_param"]["base_score"].strip("[]")))
+    f32 = lambda v: float(np.float32(v))
+    b = _Builder()
+
+    for tree in booster["model"]["trees"]:
+        if any(tree["split_type"]):
+            raise ValueError("unsupported XGBoost categorical split")
+        left, right = tree["left_children"], tree["right_children"]
+        conditions, features = tree["split_conditions"], tree["split_indices"]
+        offset = len(b.nodes)
+        for j in range(len(left)):
+            if left[j] == -1:
+                b.node(value=f32(conditions[j]))        # a leaf's condition holds its value
+            else:
+                b.node(features[j], f32(conditions[j]), bool(tree["default_left"][j]), _NAN)
+        for j in range(len(left)):
+            if left[j] != -1:
+                b.link(offset + j, offset + left[j], offset + right[j])
+        b.roots.append(offset)
+    # binary:logistic keeps base_score as a probability; trees add to its log-odds
+    base = np.float32(-np.log(np.float32(1) / base_score - np.float32(1)))
+    return b.build(base=float(base), scale=1.0, strict=True, dtype="float32")
+
+
+class CompiledEnsemble:
+    """A horizon's stacked ensemble in compiled form: both boosters and the meta-learner."""
+
+    def __init__(self, lgb: TreeEnsemble, xgb: TreeEnsemble, meta_coef, meta_intercept: float,
+                 features: list[str], feature_version: int | None):
+        self.lgb = lgb
+        self.xgb = xgb
+        self.meta_coef = np.asarray(meta_coef, dtype=np.float64)
+        self.meta_intercept = float(meta_intercept)
+        self.features = list(features)
+        self.feature_version = feature_version
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Stacked P(up) per row, as ml_engine.predict computes it from the estimators."""
+        stacked = np.column_stack([self.lgb.predict_proba(X), self.xgb.predict_proba(X)])
+        return 1 / (1 + np.exp(-(stacked @ self.meta_coef + self.meta_intercept)))
+
+
+def compile_ensemble(ensemble: dict) -> CompiledEnsemble:
+    meta = ensemble["meta"]
+    return CompiledEnsemble(compile_lgb(ensemble["lgb"]), compile_xgb(ensemble["xgb"]),
+                            meta.coef_[0], meta.intercept_[0],
+                            ensemble["features"], ensemble.get("feature_version"))
+
+
+def parity(ensemble: dict, compiled: CompiledEnsemble, X: np.ndarray) -> float:
+    """Largest absolute difference from the original estimators' probabilities on X."""
+    lgb_p = ensemble["lgb"].predict_proba(X)[:, 1]
+    xgb_p = ensemble["xgb"].predict_proba(X)[:, 1]
+    meta_p = ensemble["meta"].predict_proba(np.column_stack([lgb_p, xgb_p]))[:, 1]
+    return float(max(np.abs(compiled.lgb.predict_proba(X) - lgb_p).max(),
+                     np.abs(compiled.xgb.predict_proba(X) - xgb_p).max(),
+                     np.abs(compiled.predict_proba(X) - meta_p).max()))
+
+
+def export(label: str, ensemble: dict, X: np.ndarray) -> bool:
+    """
+    Compile a saved ensemble to MODEL_DIR/model_<label>.npz after checking it
+    against the estimators on the rows of X. On any failure the stale file is
+    removed so load() falls back to the pickle. Returns True if written.
+    """
+    path = _path(label)
+    try:
+        compiled = compile_ensemble(ensemble)
+        diff = parity(ensemble, compiled, X)
+        if not diff <= _TOLERANCE:
+            raise ValueError(f"compiled probabilities differ by {diff:.2e}")
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.savez(fh, **compiled.lgb.arrays("lgb"), **compiled.xgb.arrays("xgb"),
+                         meta_coef=compiled.meta_coef, meta_intercept=np.array(compiled.meta_intercept),
+                         features=np.array(compiled.features),
+                         feature_version=np.array(-1 if compiled.feature_version is None
+                                                  else compiled.feature_version))
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        print(f"[{label}] Compiled ensemble saved to {path} (parity {diff:.1e} on {len(X):,} rows)")
+        return True
+    except Exception as e:
+        path.unlink(missing_ok=True)
+        print(f"[{label}] Compiled export skipped: {e}")
+        return False
+
+
+def load(label: str, source: str | os.PathLike) -> CompiledEnsemble | None:
+    """The compiled ensemble of a horizon, or None if missing or older than `source` (its pickle)."""
+    path = _path(label)
+    try:
+        if path.stat().st_mtime < os.stat(source).st_mtime:
+            return None
+        with np.load(path) as npz:
+            return CompiledEnsemble(TreeEnsemble.from_arrays(npz, "lgb"), TreeEnsemble.from_arrays(npz, "xgb"),
+                                    npz["meta_coef"], float(npz["meta_intercept"]), npz["features"].tolist(),
+                                    int(npz["feature_version"]))
+    except Exception:
+        return None